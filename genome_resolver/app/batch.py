@@ -0,0 +1,215 @@
+import argparse
+import gc
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed, wait
+
+from .database.data_store import load_reference_data
+from .services.data_processing import (
+    COLUMNAR_EXTENSIONS,
+    analyse_variants,
+    is_supported_variant_file,
+    perform_full_analysis,
+    process_variant_file,
+)
+from .services.render_service import ReportRenderService, serialize_report_inputs
+from .services.report_generation import build_summary_text, generate_report, register_fonts
+from .services.variant_store import VariantStore
+
+CHECKPOINT_FILE = "checkpoint.txt"
+
+
+def sample_id_from_path(vcf_path):
+    name = os.path.basename(vcf_path)
+    for extension in (".vcf.gz", ".vcf") + COLUMNAR_EXTENSIONS:
+        if name.endswith(extension):
+            return name[: -len(extension)]
+    return name
+
+
+def find_vcf_files(input_dir):
+    return sorted(
+        os.path.join(input_dir, name)
+        for name in os.listdir(input_dir)
+        if is_supported_variant_file(name)
+    )
+
+
+def load_checkpoint(output_dir):
+    """Zwraca zbiór próbek, które zostały już przetworzone w poprzednich uruchomieniach."""
+    checkpoint_path = os.path.join(output_dir, CHECKPOINT_FILE)
+    if not os.path.exists(checkpoint_path):
+        return set()
+    with open(checkpoint_path) as checkpoint:
+        return {line.strip() for line in checkpoint if line.strip()}
+
+
+def mark_completed(output_dir, sample_id):
+    with open(os.path.join(output_dir, CHECKPOINT_FILE), "a") as checkpoint:
+        checkpoint.write(sample_id + "\n")
+        checkpoint.flush()
+        os.fsync(checkpoint.fileno())
+
+
+def analyse_sample(vcf_path, sample_dir, store_dir=None):
+    """Pełna analiza jednej próbki w procesie roboczym. Zwraca liczbę wariantów i czas."""
+    started = time.perf_counter()
+    patient_df, reference_blocks = process_variant_file(vcf_path)
+    reference_blocks = reference_blocks if len(reference_blocks) else None
+    # Próbki są już analizowane równolegle - bez dodatkowego podziału na chromosomy (workers=1)
+    if store_dir is None:
+        perform_full_analysis(patient_df, output_dir=sample_dir, reference_blocks=reference_blocks, workers=1)
+    else:
+        merged_clinvar_variants, prs_scores = analyse_variants(
+            patient_df, output_dir=sample_dir, reference_blocks=reference_blocks, workers=1
+        )
+        store_sample(store_dir, sample_id_from_path(vcf_path), patient_df, merged_clinvar_variants, prs_scores, reference_blocks)
+        generate_report(merged_clinvar_variants, prs_scores, os.path.join(sample_dir, "medical_report.pdf"))
+    return len(patient_df), time.perf_counter() - started
+
+
+def prepare_sample_report(vcf_path, sample_dir, store_dir=None):
+    """Analiza jednej próbki bez renderowania PDF - raport renderuje osobna pula procesów."""
+    started = time.perf_counter()
+    patient_df, reference_blocks = process_variant_file(vcf_path)
+    reference_blocks = reference_blocks if len(reference_blocks) else None
+    merged_clinvar_variants, prs_scores = analyse_variants(
+        patient_df, output_dir=sample_dir, reference_blocks=reference_blocks, workers=1
+    )
+    if store_dir is not None:
+        store_sample(store_dir, sample_id_from_path(vcf_path), patient_df, merged_clinvar_variants, prs_scores, reference_blocks)
+    summary_text = build_summary_text(merged_clinvar_variants, prs_scores)
+    payload = serialize_report_inputs(merged_clinvar_variants, prs_scores, summary_text)
+    return payload, len(patient_df), time.perf_counter() - started
+
+
+def store_sample(store_dir, sample_id, patient_df, merged_clinvar_variants, prs_scores, reference_blocks=None):
+    # Zapis przetworzonych wariantów pozwala później na przyrostową re-analizę (app.reanalyse)
+    store = VariantStore(store_dir)
+    store.save_patient(sample_id, patient_df, reference_blocks)
+    store.save_results(sample_id, merged_clinvar_variants, prs_scores)
+
+
+def pool_context():
+    # fork pozwala procesom roboczym współdzielić dane referencyjne (copy-on-write)
+    # zamiast ładować ClinVar i GWAS w każdym procesie od nowa
+    if "fork" in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context("fork")
+    return multiprocessing.get_context()
+
+
+def run_batch(input_dir, output_dir, workers=None, render_workers=None, store_dir=None):
+    os.makedirs(output_dir, exist_ok=True)
+    completed = load_checkpoint(output_dir)
+    pending = [path for path in find_vcf_files(input_dir) if sample_id_from_path(path) not in completed]
+    print(f"{len(completed)} samples already completed, {len(pending)} to process.")
+
+    # Dane referencyjne i czcionka są ładowane przed utworzeniem puli, aby procesy robocze
+    # dziedziczyły je po fork zamiast wczytywać je każdy z osobna
+    if pending:
+        load_reference_data()
+        register_fonts()
+        # Zamrożenie obiektów referencyjnych, aby GC nie dotykał ich stron pamięci po fork
+        gc.freeze()
+
+    started = time.perf_counter()
+    processed_samples = 0
+    processed_variants = 0
+    failed = []
+
+    def finish(sample_id, variant_count, elapsed):
+        nonlocal processed_samples, processed_variants
+        mark_completed(output_dir, sample_id)
+        processed_samples += 1
+        processed_variants += variant_count
+        print(f"Sample {sample_id} done in {elapsed:.1f}s ({variant_count} variants).")
+
+    def collect_renders(render_futures, block):
+        if block:
+            wait(render_futures)
+        for render_future in [future for future in render_futures if future.done()]:
+            sample_id, variant_count, elapsed = render_futures.pop(render_future)
+            try:
+                render_future.result()
+            except Exception as e:
+                print(f"Sample {sample_id} failed to render: {e}")
+                failed.append(sample_id)
+                continue
+            finish(sample_id, variant_count, elapsed)
+
+    # Opcjonalnie PDF-y renderuje osobna pula, niezależnie od etapu analizy
+    render_service = ReportRenderService(workers=render_workers) if render_workers else None
+    render_futures = {}
+    task = prepare_sample_report if render_service else analyse_sample
+    try:
+        with ProcessPoolExecutor(max_workers=workers, mp_context=pool_context()) as executor:
+            futures = {}
+            for vcf_path in pending:
+                sample_id = sample_id_from_path(vcf_path)
+                sample_dir = os.path.join(output_dir, sample_id)
+                futures[executor.submit(task, vcf_path, sample_dir, store_dir)] = sample_id
+
+            for future in as_completed(futures):
+                sample_id = futures[future]
+                try:
+                    result = future.result()
+                except Exception as e:
+                    print(f"Sample {sample_id} failed: {e}")
+                    failed.append(sample_id)
+                    continue
+                if render_service is None:
+                    finish(sample_id, *result)
+                    continue
+                payload, variant_count, elapsed = result
+                report_path = os.path.join(output_dir, sample_id, "medical_report.pdf")
+                render_futures[render_service.submit(payload, report_path)] = (sample_id, variant_count, elapsed)
+                collect_renders(render_futures, block=False)
+
+        if render_service is not None:
+            collect_renders(render_futures, block=True)
+    finally:
+        if render_service is not None:
+            render_service.shutdown()
+        if pending:
+            gc.unfreeze()
+
+    total_time = time.perf_counter() - started
+    print(
+        f"Processed {processed_samples} samples ({processed_variants} variants) in {total_time:.1f}s: "
+        f"{processed_samples / total_time:.2f} samples/s, "
+        f"{processed_variants / total_time:.0f} variants/s."
+    )
+    if failed:
+        print(f"{len(failed)} samples failed: {', '.join(sorted(failed))}")
+    return processed_samples, failed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Batch report generation for a cohort of patient VCF files.")
+    parser.add_argument("input_dir", help="Directory with patient .vcf/.vcf.gz or .parquet/.arrow files.")
+    parser.add_argument("output_dir", help="Directory for per-sample outputs and the checkpoint file.")
+    parser.add_argument("--workers", type=int, default=None, help="Number of worker processes (default: CPU count).")
+    parser.add_argument(
+        "--render-workers",
+        type=int,
+        default=None,
+        help="Render PDFs in a separate pool of this many processes (default: render inside analysis workers).",
+    )
+    parser.add_argument("--store", default=None, help="Persist processed variant sets and results for incremental re-analysis.")
+    args = parser.parse_args(argv)
+
+    _, failed = run_batch(
+        args.input_dir,
+        args.output_dir,
+        workers=args.workers,
+        render_workers=args.render_workers,
+        store_dir=args.store,
+    )
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
+
+# run batch: python -m app.batch <input_dir> <output_dir> --workers 8 [--render-workers 4] [--store variant_store]
@@ -0,0 +1,25 @@
+import os
+
+# Liczba procesów do równoległej analizy chromosomów w ramach jednego zapytania. Domyślnie 1
+# (bez podziału): pula wymaga wczytania danych referencyjnych przed startem procesu API
+# (wolniejszy zimny start), a każdy worker uvicorn ma własną pulę. Ograniczona do liczby CPU.
+ANALYSIS_WORKERS = max(1, min(int(os.environ.get("GENOME_RESOLVER_ANALYSIS_WORKERS", 1)), os.cpu_count() or 1))
+# Poniżej tej liczby wariantów analiza działa w jednym procesie (narzut puli przewyższa zysk)
+SHARDING_MIN_VARIANTS = int(os.environ.get("GENOME_RESOLVER_SHARDING_MIN_VARIANTS", 50000))
+# Wczytywanie ClinVar i GWAS w tle zaraz po starcie procesu (0 - dopiero przy pierwszym zapytaniu;
+# wyłącza też podział na chromosomy w API)
+PRELOAD_REFERENCE_DATA = os.environ.get("GENOME_RESOLVER_PRELOAD_REFERENCE", "1") != "0"
+# Docelowy czas od uruchomienia procesu do pierwszej odpowiedzi 200 z /health (python -m app.startup_profile)
+STARTUP_TARGET_SECONDS = float(os.environ.get("GENOME_RESOLVER_STARTUP_TARGET_SECONDS", 2.0))
+# Budżet pamięci na proces API dla równolegle analizowanych plików wariantów (MiB)
+ADMISSION_MEMORY_BUDGET_MB = int(os.environ.get("GENOME_RESOLVER_MEMORY_BUDGET_MB", 4096))
+# Maksymalna liczba zapytań czekających na budżet; kolejne dostają 503 z Retry-After
+ADMISSION_MAX_QUEUE = int(os.environ.get("GENOME_RESOLVER_ADMISSION_MAX_QUEUE", 8))
+# Jak długo (s) zapytanie może czekać w kolejce, zanim zostanie odrzucone
+ADMISSION_QUEUE_TIMEOUT = float(os.environ.get("GENOME_RESOLVER_ADMISSION_QUEUE_TIMEOUT", 30))
+# Liczba procesów renderujących raporty PDF w każdym procesie API (0 - renderowanie w procesie API)
+RENDER_WORKERS = int(os.environ.get("GENOME_RESOLVER_RENDER_WORKERS", 1))
+# Maksymalna liczba raportów w kolejce renderowania procesu API (domyślnie 2 na proces renderujący)
+RENDER_MAX_PENDING = int(os.environ.get("GENOME_RESOLVER_RENDER_MAX_PENDING", 0)) or None
+# Jak długo (s) zapytanie czeka na miejsce w kolejce renderowania, zanim dostanie 503
+RENDER_QUEUE_TIMEOUT = float(os.environ.get("GENOME_RESOLVER_RENDER_QUEUE_TIMEOUT", 10))
@@ -1,6 +1,51 @@
+import os
+import threading
 
-from app.database.load_db import load_clinvar_vcf, load_gwas_to_db
+DATABASE_DIR = os.path.dirname(os.path.abspath(__file__))
+CLINVAR_PATH = os.environ.get("GENOME_RESOLVER_CLINVAR_PATH", os.path.join(DATABASE_DIR, "clinvar_20240917.vcf.gz"))
+GWAS_PATH = os.environ.get("GENOME_RESOLVER_GWAS_PATH", os.path.join(DATABASE_DIR, "gwas_catalog.tsv"))
 
+# Dane referencyjne są wczytywane przy pierwszym użyciu (lub w tle przy starcie aplikacji),
+# a nie przy imporcie modułu - import app.main nie czeka na ClinVar i katalog GWAS
+_reference_data = {}
+_reference_lock = threading.Lock()
 
-clinvar_df = load_clinvar_vcf("app/database/clinvar_20240917.vcf.gz")
-gwas_df = load_gwas_to_db("app/database/gwas_catalog.tsv")
\ No newline at end of file
+
+def _load(name):
+    with _reference_lock:
+        if name not in _reference_data:
+            # load_db importuje cyvcf2 - tylko wtedy, gdy dane są naprawdę potrzebne
+            from .load_db import load_clinvar_vcf, load_gwas_to_db
+
+            if name == "clinvar":
+                _reference_data[name] = load_clinvar_vcf(CLINVAR_PATH)
+            else:
+                _reference_data[name] = load_gwas_to_db(GWAS_PATH)
+        return _reference_data[name]
+
+
+def get_clinvar_df():
+    return _load("clinvar")
+
+
+def get_gwas_df():
+    return _load("gwas")
+
+
+def load_reference_data():
+    """Wczytuje ClinVar i GWAS (np. w tle przy starcie lub przed fork w trybie wsadowym)."""
+    get_clinvar_df()
+    get_gwas_df()
+
+
+def reference_data_loaded():
+    return "clinvar" in _reference_data and "gwas" in _reference_data
+
+
+def __getattr__(name):
+    # Zgodność wsteczna: data_store.clinvar_df / data_store.gwas_df wczytują dane przy pierwszym dostępie
+    if name == "clinvar_df":
+        return get_clinvar_df()
+    if name == "gwas_df":
+        return get_gwas_df()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
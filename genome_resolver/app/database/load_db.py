@@ -1,4 +1,6 @@
 # /database/clinvar_db.py
+import os
+import tempfile
 from cyvcf2 import VCF
 import pandas as pd
 from .db import get_db
@@ -19,8 +21,102 @@ def load_clinvar_vcf(file_path: str):
     #with get_db() as conn:
     #    df_clinvar.to_sql('clinvar', conn, if_exists='replace', index=False)
     return df_clinvar
-def load_gwas_to_db(file_path: str):
-    df_gwas = pd.read_csv(file_path, sep='\t')
+
+# Kolumny katalogu GWAS używane w analizie (pozostałe ~30 kolumn nie jest wczytywanych)
+GWAS_COLUMNS = ["CHR_ID", "CHR_POS", "SNP_ID_CURRENT", "DISEASE/TRAIT", "P-VALUE", "OR or BETA", "MAPPED_GENE"]
+GWAS_CATEGORICAL_COLUMNS = ["DISEASE/TRAIT", "MAPPED_GENE"]
+# Numer wiersza katalogu - wspólny dla pozycji jednej asocjacji po rozdzieleniu wiersza
+ASSOCIATION_ID = "ASSOCIATION_ID"
+GWAS_TABLE_COLUMNS = GWAS_COLUMNS + [ASSOCIATION_ID]
+# Wiersze z wieloma pozycjami, np. "12345;67890" (haplotypy) lub "12345 x 67890" (interakcje)
+MULTI_POSITION_SEPARATOR = r"\s*(?:;|\sx\s)\s*"
+
+def split_multi_positions(df_gwas: pd.DataFrame) -> pd.DataFrame:
+    """
+    Rozdziela wiersze z wieloma pozycjami CHR_ID/CHR_POS na osobne wiersze. Wszystkie pozycje
+    jednej asocjacji mają ten sam ASSOCIATION_ID - jej waga (OR or BETA) liczy się w PRS raz.
+    """
+    chr_ids = df_gwas["CHR_ID"].fillna("").astype(str).str.split(MULTI_POSITION_SEPARATOR, regex=True)
+    chr_positions = df_gwas["CHR_POS"].fillna("").astype(str).str.split(MULTI_POSITION_SEPARATOR, regex=True)
+
+    paired_ids, paired_positions = [], []
+    for ids, positions in zip(chr_ids, chr_positions):
+        # Jeden chromosom dla wielu pozycji - powielamy go dla każdej pozycji
+        if len(ids) == 1:
+            ids = ids * len(positions)
+        length = min(len(ids), len(positions))
+        paired_ids.append(ids[:length])
+        paired_positions.append(positions[:length])
+
+    df_gwas = df_gwas.assign(CHR_ID=paired_ids, CHR_POS=paired_positions, **{ASSOCIATION_ID: range(len(df_gwas))})
+    return df_gwas.explode(["CHR_ID", "CHR_POS"], ignore_index=True)
+
+def parse_gwas_catalog(file_path: str) -> pd.DataFrame:
+    df_gwas = pd.read_csv(
+        file_path,
+        sep='\t',
+        usecols=GWAS_COLUMNS,
+        dtype={column: str for column in GWAS_COLUMNS},
+        keep_default_na=False,
+        na_values=[""],
+    )
+    df_gwas = split_multi_positions(df_gwas)
+
+    # Jednorazowa konwersja typów zamiast pd.to_numeric przy każdym zapytaniu
+    df_gwas["CHR_ID"] = df_gwas["CHR_ID"].where(df_gwas["CHR_ID"] != "")
+    df_gwas["CHR_POS"] = pd.to_numeric(df_gwas["CHR_POS"], errors="coerce").astype("Int64")
+    df_gwas["P-VALUE"] = pd.to_numeric(df_gwas["P-VALUE"], errors="coerce").astype("float64")
+    df_gwas["OR or BETA"] = pd.to_numeric(df_gwas["OR or BETA"], errors="coerce").astype("float64")
+    for column in GWAS_CATEGORICAL_COLUMNS:
+        df_gwas[column] = df_gwas[column].astype("category")
+    return df_gwas
+
+def gwas_cache_path(file_path: str) -> str:
+    return os.path.splitext(file_path)[0] + ".arrow"
+
+def write_gwas_cache(df_gwas: pd.DataFrame, cache_path: str):
+    """
+    Zapisuje cache do pliku tymczasowego w tym samym katalogu i podmienia go atomowo
+    (os.replace) - równolegle startujące procesy nie zmapują częściowo zapisanego pliku.
+    """
+    import pyarrow as pa
+    from pyarrow import feather
+
+    temp_path = None
+    try:
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(cache_path)), suffix=".tmp")
+        os.close(fd)
+        feather.write_feather(pa.Table.from_pandas(df_gwas, preserve_index=False), temp_path, compression="uncompressed")
+        os.replace(temp_path, cache_path)
+    except OSError as e:
+        print(f"Could not write GWAS cache {cache_path}: {e}")
+        if temp_path is not None and os.path.exists(temp_path):
+            os.remove(temp_path)
+
+def load_gwas_to_db(file_path: str, cache_path=None):
+    """
+    Wczytuje katalog GWAS (tylko potrzebne kolumny, z jawnymi typami). Wynik jest zapisywany
+    w nieskompresowanym pliku Arrow IPC obok TSV, który przy kolejnych startach jest mapowany
+    do pamięci zamiast ponownego parsowania TSV.
+    """
+    cache_path = cache_path or gwas_cache_path(file_path)
+    try:
+        import pyarrow as pa
+        from pyarrow import feather
+    except ImportError:
+        return parse_gwas_catalog(file_path)
+
+    if os.path.exists(cache_path) and os.path.getmtime(cache_path) >= os.path.getmtime(file_path):
+        try:
+            table = feather.read_table(cache_path, memory_map=True)
+            if table.column_names == GWAS_TABLE_COLUMNS:
+                return table.to_pandas(split_blocks=True)
+        except (pa.ArrowException, OSError) as e:
+            # Uszkodzony lub niepełny plik - traktujemy jak brak cache i parsujemy TSV ponownie
+            print(f"Could not read GWAS cache {cache_path}: {e}")
+
+    df_gwas = parse_gwas_catalog(file_path)
+    write_gwas_cache(df_gwas, cache_path)
 
     #with get_db() as conn:
     #    df_gwas.to_sql('gwas_catalog', conn, if_exists='replace', index=False)
@@ -1,8 +1,60 @@
+import threading
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
+from fastapi.responses import JSONResponse
+from .config import ANALYSIS_WORKERS, PRELOAD_REFERENCE_DATA, RENDER_MAX_PENDING, RENDER_WORKERS
+from .database import data_store
 from .routes import routes
-from .services import report_generation
+from .services.data_processing import get_shard_pool, reset_shard_pool, shard_pool_ready
+from .services.render_service import start_render_service, stop_render_service
+
+# Podział analizy na chromosomy jest włączany jawnie (GENOME_RESOLVER_ANALYSIS_WORKERS > 1)
+SHARDING_ENABLED = PRELOAD_REFERENCE_DATA and ANALYSIS_WORKERS > 1
+
+
+def warm_up():
+    """Rejestruje czcionki raportu i wczytuje dane referencyjne - w tle, bez blokowania startu."""
+    try:
+        from .services.report_generation import register_fonts
+        register_fonts()
+        data_store.load_reference_data()
+    except Exception as e:
+        # Dane zostaną wczytane ponownie przy pierwszym zapytaniu, które ich potrzebuje
+        print(f"Reference data warm-up failed: {e}")
+
+
+def start_shard_pool():
+    """
+    Tworzy pulę procesów do analizy chromosomów przed startem wątków aplikacji (fork z procesu
+    wielowątkowego jest niebezpieczny). Procesy dziedziczą dane referencyjne, więc przy
+    włączonym podziale dane są wczytywane synchronicznie, zanim proces zacznie odpowiadać -
+    dlatego podział jest domyślnie wyłączony.
+    """
+    try:
+        get_shard_pool(ANALYSIS_WORKERS)
+    except Exception as e:
+        # Analiza będzie działać w jednym procesie; /ready zgłasza brak puli
+        print(f"Shard pool start failed: {e}")
 
-app = FastAPI(title="Genomic Analysis API")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if SHARDING_ENABLED:
+        start_shard_pool()
+    # Bez podziału na chromosomy proces odpowiada na /health od razu; /ready zwraca 200
+    # dopiero po wczytaniu danych w tle
+    if PRELOAD_REFERENCE_DATA:
+        threading.Thread(target=warm_up, name="reference-data-warm-up", daemon=True).start()
+    # Raporty PDF są renderowane w osobnych procesach (ReportLab jest ograniczony przez GIL)
+    if RENDER_WORKERS > 0:
+        start_render_service(RENDER_WORKERS, RENDER_MAX_PENDING)
+    yield
+    stop_render_service()
+    reset_shard_pool()
+
+
+app = FastAPI(title="Genomic Analysis API", lifespan=lifespan)
 
 # Include routers for text generation and any other endpoints
 app.include_router(routes.router, prefix="/text", tags=["Text Generation"])
@@ -14,4 +66,19 @@ app.include_router(routes.router, prefix="/text", tags=["Text Generation"])
 def read_root():
     return {"message": "Genomic Analysis API is running!"}
 
+# Liveness - proces działa i obsługuje zapytania
+@app.get("/health")
+def health():
+    return {"status": "ok"}
+
+# Readiness - dane referencyjne są w pamięci, zapytania analityczne nie będą czekać na ich wczytanie,
+# a przy włączonym podziale na chromosomy działa pula procesów (po jej awarii worker wymaga restartu)
+@app.get("/ready")
+def ready():
+    if not data_store.reference_data_loaded():
+        return JSONResponse(status_code=503, content={"status": "loading"})
+    if SHARDING_ENABLED and not shard_pool_ready():
+        return JSONResponse(status_code=503, content={"status": "shard pool unavailable"})
+    return {"status": "ready"}
+
 # run app: uvicorn app.main:app --reload
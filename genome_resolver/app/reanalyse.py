@@ -0,0 +1,50 @@
+import argparse
+import os
+import time
+
+from .database.load_db import load_clinvar_vcf, load_gwas_to_db
+from .services.variant_store import VariantStore, reanalyse_patients
+
+CHANGED_PATIENTS_FILE = "changed_patients.txt"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Re-annotate stored patient variant sets after a ClinVar or GWAS catalog update."
+    )
+    parser.add_argument("store_dir", help="Variant store written by python -m app.batch --store.")
+    parser.add_argument("--old-clinvar", required=True, help="ClinVar VCF used for the stored results.")
+    parser.add_argument("--new-clinvar", required=True, help="New ClinVar VCF release.")
+    parser.add_argument("--old-gwas", required=True, help="GWAS catalog TSV used for the stored results.")
+    parser.add_argument("--new-gwas", required=True, help="New GWAS catalog TSV.")
+    args = parser.parse_args(argv)
+
+    started = time.perf_counter()
+    store = VariantStore(args.store_dir)
+    changed_patients = reanalyse_patients(
+        store,
+        load_clinvar_vcf(args.old_clinvar),
+        load_clinvar_vcf(args.new_clinvar),
+        load_gwas_to_db(args.old_gwas),
+        load_gwas_to_db(args.new_gwas),
+    )
+
+    # Lista pacjentów, dla których trzeba ponownie wygenerować raport PDF
+    with open(os.path.join(args.store_dir, CHANGED_PATIENTS_FILE), "w") as changed_file:
+        for patient_id in sorted(changed_patients):
+            changed_file.write(patient_id + "\n")
+
+    for patient_id, changes in sorted(changed_patients.items()):
+        stages = [name for name, flag in (("ClinVar", changes["clinvar_changed"]), ("PRS", changes["prs_changed"])) if flag]
+        print(f"{patient_id}: {', '.join(stages)} changed")
+    print(
+        f"{len(changed_patients)} of {len(store.patient_ids())} patients changed "
+        f"({time.perf_counter() - started:.1f}s)."
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
+
+# run re-analysis: python -m app.reanalyse variant_store --old-clinvar ... --new-clinvar ... --old-gwas ... --new-gwas ...
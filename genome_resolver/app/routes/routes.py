@@ -1,39 +1,199 @@
-from typing import List
+import asyncio
+import math
+import os
+import shutil
+import tempfile
+from contextlib import ExitStack
+from typing import List, Literal, Optional
 import pandas as pd
-from fastapi import APIRouter, UploadFile, File, HTTPException
-from fastapi.responses import FileResponse
+from fastapi import APIRouter, UploadFile, File, HTTPException, Query
+from fastapi.responses import FileResponse, StreamingResponse
+from starlette.background import BackgroundTask
+from starlette.concurrency import run_in_threadpool
 from ..services.text_generation import (
     generate_summary_text,
     generate_test
 )
-from ..database.data_store import clinvar_df, gwas_df
-from ..services.data_processing import perform_full_analysis, process_vcf_file, merge_clinvar_variants, merge_gwas_variants
+from ..config import RENDER_QUEUE_TIMEOUT
+from ..database.data_store import get_clinvar_df, get_gwas_df
+from ..services.data_processing import (
+    analyse_variants,
+    perform_full_analysis,
+    process_variant_file,
+    is_supported_variant_file,
+    merge_clinvar_variants,
+    merge_gwas_variants
+)
+from ..services.reference_blocks import ReferenceBlockIndex
+from ..services.admission import AdmissionController, AdmissionRejected, estimate_upload_cost
+from ..services.render_service import RenderQueueFull, get_render_service, serialize_report_inputs
+from ..services.streaming import (
+    project_columns,
+    filter_clinvar_results,
+    filter_prs_results,
+    paginate,
+    iter_ndjson_batches,
+    iter_arrow_batches,
+)
 
 router = APIRouter()
+# Domyślny rozmiar strony w trybie JSON
+DEFAULT_PAGE_SIZE = 5
+# Jeden kontroler na proces - budżet pamięci dotyczy całego workera
+admission = AdmissionController()
+
+INVALID_FILE_TYPE = "Please upload VCF (.vcf, .vcf.gz) or columnar variant files (.parquet, .arrow)."
+
+def read_variant_upload(file: UploadFile):
+    """Wczytuje przesłany plik VCF lub tabelę Parquet/Arrow; błędy schematu zwracają 400."""
+    try:
+        return process_variant_file(file)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid variant table {file.filename}: {e}")
+    except ImportError:
+        raise HTTPException(status_code=501, detail="Columnar uploads require the pyarrow package.")
+
+async def admit_and_run(files: List[UploadFile], work):
+    """
+    Uruchamia analizę w puli wątków po przyjęciu zapytania przez kontroler pamięci.
+    Pętla zdarzeń pozostaje wolna (np. dla /health), gdy zapytanie czeka w kolejce.
+    Zwraca (wynik, release) - budżet pozostaje zajęty do wywołania release().
+    """
+    def admitted_work():
+        with ExitStack() as stack:
+            stack.enter_context(admission.admit(estimate_upload_cost(files)))
+            result = work()
+            # Sukces - zwolnienie budżetu przejmuje wywołujący (błąd zwalnia go od razu)
+            return result, stack.pop_all().close
+
+    try:
+        return await run_in_threadpool(admitted_work)
+    except AdmissionRejected as e:
+        headers = {"Retry-After": str(e.retry_after)} if e.retry_after else None
+        raise HTTPException(status_code=e.status_code, detail=str(e), headers=headers)
+
+async def run_admitted(files: List[UploadFile], work):
+    """Jak admit_and_run, ale budżet jest zwalniany zaraz po zakończeniu analizy."""
+    result, release = await admit_and_run(files, work)
+    release()
+    return result
+
+def release_after_response(response, release):
+    """
+    Odpowiedź strumieniowa trzyma wynik w pamięci aż do wysłania ostatniego fragmentu -
+    budżet jest zwalniany dopiero wtedy (także po przerwaniu połączenia).
+    """
+    if not isinstance(response, StreamingResponse):
+        release()
+        return response
+
+    chunks = response.body_iterator
+
+    async def release_when_sent():
+        try:
+            async for chunk in chunks:
+                yield chunk
+        finally:
+            release()
+
+    response.body_iterator = release_when_sent()
+    return response
+
+def build_result_response(df: pd.DataFrame, message: str, response_format: str, offset: int, limit, columns):
+    """
+    Buduje odpowiedź w jednym z trybów: stronicowany JSON, NDJSON lub Arrow IPC.
+    offset i limit obowiązują we wszystkich trybach; bez limit JSON zwraca DEFAULT_PAGE_SIZE
+    wierszy, a tryby strumieniowe - wszystkie wiersze od offset.
+    """
+    try:
+        df = project_columns(df, columns)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    if response_format == "ndjson":
+        return StreamingResponse(iter_ndjson_batches(paginate(df, offset, limit)), media_type="application/x-ndjson")
+    if response_format == "arrow":
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            raise HTTPException(status_code=501, detail="Arrow responses require the pyarrow package.")
+        return StreamingResponse(iter_arrow_batches(paginate(df, offset, limit)), media_type="application/vnd.apache.arrow.stream")
+
+    limit = limit or DEFAULT_PAGE_SIZE
+    return {
+        "message": message,
+        "total": len(df),
+        "offset": offset,
+        "limit": limit,
+        "data": paginate(df, offset, limit).to_dict(),
+    }
 
 @router.post("/generate-summary")
 async def summary_endpoint():
-    return generate_summary_text(gwas_df, clinvar_df)
+    return generate_summary_text(get_gwas_df(), get_clinvar_df())
 
 @router.post("/merge-clinvar-variants")
-async def merge_clinvar_variants_endpoint(file: UploadFile = File(...)):
-    if not file.filename.endswith(".vcf") and not file.filename.endswith(".vcf.gz"):
-        raise HTTPException(status_code=400, detail="Invalid file type. Please upload a VCF file.")
+async def merge_clinvar_variants_endpoint(
+    file: UploadFile = File(...),
+    response_format: Literal["json", "ndjson", "arrow"] = Query("json", alias="format"),
+    offset: int = Query(0, ge=0),
+    limit: Optional[int] = Query(None, ge=1),
+    columns: Optional[List[str]] = Query(None),
+    clnsig: Optional[List[str]] = Query(None),
+):
+    if not is_supported_variant_file(file.filename):
+        raise HTTPException(status_code=400, detail=f"Invalid file type. {INVALID_FILE_TYPE}")
     
-    patient_df = process_vcf_file(file)
-    matched_variants = merge_clinvar_variants(patient_df, clinvar_df)
+    def analyse():
+        patient_df, _ = read_variant_upload(file)
+        # Wynik trafia tylko do odpowiedzi - bez pośredniego pliku CSV
+        return merge_clinvar_variants(patient_df, get_clinvar_df(), output_dir=None)
+
+    matched_variants, release = await admit_and_run([file], analyse)
+    try:
+        matched_variants = filter_clinvar_results(matched_variants, clnsig)
+        response = build_result_response(
+            matched_variants, "ClinVar variants merged successfully.", response_format, offset, limit, columns
+        )
+    except Exception:
+        release()
+        raise
     
-    return {"message": "ClinVar variants merged successfully.", "data": matched_variants.head().to_dict()}
+    return release_after_response(response, release)
 
 @router.post("/merge-gwas-variants")
-async def merge_gwas_variants_endpoint(file: UploadFile = File(...)):
-    if not file.filename.endswith(".vcf") and not file.filename.endswith(".vcf.gz"):
-        raise HTTPException(status_code=400, detail="Invalid file type. Please upload a VCF file.")
+async def merge_gwas_variants_endpoint(
+    file: UploadFile = File(...),
+    response_format: Literal["json", "ndjson", "arrow"] = Query("json", alias="format"),
+    offset: int = Query(0, ge=0),
+    limit: Optional[int] = Query(None, ge=1),
+    columns: Optional[List[str]] = Query(None),
+    p_value: float = Query(5e-8, gt=0, le=1),
+    risk_category: Optional[List[str]] = Query(None),
+):
+    if not is_supported_variant_file(file.filename):
+        raise HTTPException(status_code=400, detail=f"Invalid file type. {INVALID_FILE_TYPE}")
     
-    patient_df = process_vcf_file(file)
-    prs_scores = merge_gwas_variants(patient_df, gwas_df)
+    def analyse():
+        patient_df, reference_blocks = read_variant_upload(file)
+        # Bloki gVCF - ten sam PRS co w /generate-report; wynik bez pośredniego pliku CSV
+        return merge_gwas_variants(
+            patient_df,
+            get_gwas_df(),
+            output_dir=None,
+            p_value_threshold=p_value,
+            reference_blocks=reference_blocks if len(reference_blocks) else None,
+        )
+
+    prs_scores, release = await admit_and_run([file], analyse)
+    try:
+        prs_scores = filter_prs_results(prs_scores, risk_category)
+        response = build_result_response(prs_scores, "GWAS variants merged successfully.", response_format, offset, limit, columns)
+    except Exception:
+        release()
+        raise
     
-    return {"message": "GWAS variants merged successfully.", "data": prs_scores.head().to_dict()}
+    return release_after_response(response, release)
 
 @router.get("/test_llm")
 async def test_llm(input_text: str):
@@ -41,50 +201,100 @@ async def test_llm(input_text: str):
 
 @router.post("/upload-vcfs")
 async def upload_vcfs(files: List[UploadFile] = File(...)):
-    processed_files = []
-
     for file in files:
         # Sprawdzanie rozszerzenia pliku
-        if not file.filename.endswith(".vcf") and not file.filename.endswith(".vcf.gz"):
-            raise HTTPException(status_code=400, detail=f"Invalid file type: {file.filename}. Please upload VCF files.")
-        
-        try:
-            # Przetwarzanie każdego pliku VCF
-            vcf_df = process_vcf_file(file)
-            if vcf_df is None:
-                raise HTTPException(status_code=500, detail=f"Failed to process VCF file: {file.filename}.")
-            
-            # Dodanie przetworzonych danych do listy
-            processed_files.append({
-                "filename": file.filename,
-                "data": vcf_df.head().to_dict()  # Przykład: zwracamy pierwsze kilka wierszy jako podgląd
-            })
-        except Exception as e:
-            raise HTTPException(status_code=500, detail=f"An error occurred while processing file {file.filename}: {str(e)}")
+        if not is_supported_variant_file(file.filename):
+            raise HTTPException(status_code=400, detail=f"Invalid file type: {file.filename}. {INVALID_FILE_TYPE}")
+
+    def process_files():
+        processed_files = []
+        for file in files:
+            try:
+                # Przetwarzanie każdego pliku VCF
+                vcf_df, _ = read_variant_upload(file)
+                if vcf_df is None:
+                    raise HTTPException(status_code=500, detail=f"Failed to process VCF file: {file.filename}.")
+
+                # Dodanie przetworzonych danych do listy
+                processed_files.append({
+                    "filename": file.filename,
+                    "data": vcf_df.head().to_dict()  # Przykład: zwracamy pierwsze kilka wierszy jako podgląd
+                })
+            except HTTPException:
+                raise
+            except Exception as e:
+                raise HTTPException(status_code=500, detail=f"An error occurred while processing file {file.filename}: {str(e)}")
+        return processed_files
+
+    processed_files = await run_admitted(files, process_files)
 
     return {"message": "VCF files processed successfully.", "processed_files": processed_files}
 
 
+async def render_in_service(render_service, merged_clinvar_variants, prs_scores, output_dir):
+    """
+    Renderuje raport PDF w puli procesów renderujących. Pętla zdarzeń nie czeka na miejsce
+    w kolejce ani na render; pełna kolejka po RENDER_QUEUE_TIMEOUT zwraca 503 z Retry-After.
+    """
+    payload = serialize_report_inputs(merged_clinvar_variants, prs_scores)
+    report_path = os.path.join(output_dir, "medical_report.pdf")
+    try:
+        future = await run_in_threadpool(render_service.submit, payload, report_path, RENDER_QUEUE_TIMEOUT)
+    except RenderQueueFull as e:
+        retry_after = str(max(1, math.ceil(RENDER_QUEUE_TIMEOUT)))
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": retry_after})
+    return await asyncio.wrap_future(future)
+
 @router.post("/generate-report")
 async def generate_health_report(files: List[UploadFile] = File(...)):
     # Sprawdzanie każdego pliku
     for file in files:
-        if not file.filename.endswith(".vcf") and not file.filename.endswith(".vcf.gz"):
-            raise HTTPException(status_code=400, detail=f"Invalid file type: {file.filename}. Please upload VCF files.")
+        if not is_supported_variant_file(file.filename):
+            raise HTTPException(status_code=400, detail=f"Invalid file type: {file.filename}. {INVALID_FILE_TYPE}")
 
-    # Przetwarzanie plików i łączenie wyników w jeden DataFrame
-    all_variants = []
-    for file in files:
-        patient_df = process_vcf_file(file)
-        all_variants.append(patient_df)
+    def analyse():
+        # Przetwarzanie plików i łączenie wyników w jeden DataFrame
+        all_variants = []
+        all_reference_blocks = []
+        for file in files:
+            patient_df, reference_blocks = read_variant_upload(file)
+            all_variants.append(patient_df)
+            all_reference_blocks.append(reference_blocks)
 
-    # Łączenie wszystkich DataFrame w jeden
-    combined_df = pd.concat(all_variants, ignore_index=True)
+        # Łączenie wszystkich DataFrame w jeden
+        combined_df = pd.concat(all_variants, ignore_index=True)
+        # Bloki referencyjne są dostępne tylko dla plików gVCF
+        combined_blocks = ReferenceBlockIndex.concat(all_reference_blocks)
 
-    # Przeprowadzenie analizy i wygenerowanie jednego raportu PDF
-    report_path = perform_full_analysis(combined_df)
-    if not report_path:
-        raise HTTPException(status_code=500, detail="Failed to generate the report.")
-    
-    return FileResponse(report_path, media_type="application/pdf", filename="medical_report.pdf")
+        reference_blocks = combined_blocks if len(combined_blocks) else None
+
+        if render_service is None:
+            # Przeprowadzenie analizy i wygenerowanie jednego raportu PDF w procesie API
+            return perform_full_analysis(combined_df, output_dir=output_dir, reference_blocks=reference_blocks)
+        # Raport renderuje pula procesów - tutaj tylko analiza
+        return analyse_variants(combined_df, output_dir=output_dir, reference_blocks=reference_blocks)
+
+    render_service = get_render_service()
+    # Raport i pliki CSV trafiają do katalogu tego zapytania - usuwanego po wysłaniu odpowiedzi
+    output_dir = tempfile.mkdtemp(prefix="report-")
+    try:
+        # Wszystkie pliki pacjenta są analizowane razem - koszt zapytania to suma kosztów plików
+        result = await run_admitted(files, analyse)
+        report_path = result if render_service is None else await render_in_service(render_service, *result, output_dir)
+        if not report_path:
+            raise HTTPException(status_code=500, detail="Failed to generate the report.")
+    except Exception:
+        shutil.rmtree(output_dir, ignore_errors=True)
+        raise
+
+    return FileResponse(
+        report_path,
+        media_type="application/pdf",
+        filename="medical_report.pdf",
+        background=BackgroundTask(shutil.rmtree, output_dir, ignore_errors=True),
+    )
 
+# Metryki kontroli przyjmowania zapytań (głębokość kolejki, odrzucenia, zajęty budżet)
+@router.get("/admission-metrics")
+async def admission_metrics():
+    return admission.metrics()
@@ -0,0 +1,205 @@
+import math
+import os
+import threading
+import time
+import zlib
+from collections import Counter, deque, namedtuple
+from contextlib import contextmanager
+
+from ..config import ADMISSION_MEMORY_BUDGET_MB, ADMISSION_MAX_QUEUE, ADMISSION_QUEUE_TIMEOUT
+from ..services.data_processing import COLUMNAR_EXTENSIONS
+
+# Szczyt pamięci przy wczytaniu rekordu VCF to ok. 550 B (listy Pythona przed filtrowaniem);
+# z zapasem na łączenie z ClinVar/GWAS i PRS przyjmujemy 1 KiB na rekord
+BYTES_PER_RECORD = 1024
+# Wczytanie rekordu to ok. 5 µs CPU, analiza mniej więcej drugie tyle
+CPU_SECONDS_PER_RECORD = 1e-5
+# Stały narzut zapytania (bufory uploadu, wyniki, raport PDF)
+REQUEST_BASE_MEMORY = 32 * 1024 * 1024
+# Rozmiar początku pliku używanego do oszacowania liczby rekordów
+SAMPLE_BYTES = 1024 * 1024
+# Gdy próbka zawiera tylko nagłówek VCF
+DEFAULT_VCF_RECORD_BYTES = 100
+# Tabele Arrow IPC są nieskompresowane - ok. 64 B na wiersz z listą genotypów
+ARROW_BYTES_PER_RECORD = 64
+GZIP_MAGIC = b"\x1f\x8b"
+
+RequestCost = namedtuple("RequestCost", ["records", "memory_bytes", "cpu_seconds"])
+
+
+class AdmissionRejected(Exception):
+    """Zapytanie nie zostało przyjęte: 413 (nigdy nie zmieści się w budżecie) lub 503 (spróbuj później)."""
+
+    def __init__(self, status_code, detail, retry_after=None):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
+def decompress_head(head):
+    """Dekompresuje początek pliku gzip/BGZF (wiele członów). Zwraca (dane, liczba zużytych bajtów)."""
+    chunks, remaining = [], head
+    while remaining:
+        decompressor = zlib.decompressobj(wbits=31)
+        try:
+            chunks.append(decompressor.decompress(remaining))
+        except zlib.error:
+            break
+        if not decompressor.eof:
+            # Ostatni człon jest ucięty przez próbkę - zużyty w całości
+            remaining = b""
+            break
+        remaining = decompressor.unused_data
+    return b"".join(chunks), len(head) - len(remaining)
+
+
+def sample_vcf_record_count(stream, size, sample_bytes=SAMPLE_BYTES):
+    """
+    Szacuje liczbę rekordów VCF (.vcf lub .vcf.gz) na podstawie początku pliku: średnia
+    długość rekordu z próbki i stopień kompresji próbki ekstrapolowane na cały rozmiar.
+    """
+    head = stream.read(sample_bytes)
+    stream.seek(0)
+    if head[:2] == GZIP_MAGIC:
+        text, consumed = decompress_head(head)
+    else:
+        text, consumed = head, len(head)
+
+    whole_file = len(head) >= size
+    if not whole_file:
+        # Ostatnia linia próbki jest zwykle niepełna
+        text = text[: text.rfind(b"\n") + 1]
+    lines = [line for line in text.split(b"\n") if line]
+    records = [line for line in lines if not line.startswith(b"#")]
+    if whole_file:
+        return len(records)
+
+    header_bytes = sum(len(line) + 1 for line in lines if line.startswith(b"#"))
+    record_bytes = sum(len(line) + 1 for line in records) / len(records) if records else DEFAULT_VCF_RECORD_BYTES
+    uncompressed_size = size * (len(text) / consumed) if consumed else size
+    return max(int((uncompressed_size - header_bytes) / record_bytes), len(records))
+
+
+def parquet_record_count(stream, size):
+    # Liczba wierszy jest zapisana w stopce pliku Parquet - bez wczytywania danych
+    try:
+        import pyarrow.parquet as pq
+        count = pq.ParquetFile(stream).metadata.num_rows
+    except Exception:
+        # Bez pyarrow lub dla uszkodzonego pliku: oszacowanie z rozmiaru (błąd zgłosi parser)
+        count = size // ARROW_BYTES_PER_RECORD
+    stream.seek(0)
+    return count
+
+
+def upload_size(file):
+    if getattr(file, "size", None) is not None:
+        return file.size
+    position = file.file.tell()
+    size = file.file.seek(0, os.SEEK_END)
+    file.file.seek(position)
+    return size
+
+
+def estimate_upload_cost(files):
+    """Szacuje pamięć i czas CPU potrzebne do analizy przesłanych plików wariantów."""
+    records = 0
+    for file in files:
+        size = upload_size(file)
+        name = (file.filename or "").lower()
+        if name.endswith(".parquet"):
+            records += parquet_record_count(file.file, size)
+        elif name.endswith(COLUMNAR_EXTENSIONS):
+            records += size // ARROW_BYTES_PER_RECORD
+        else:
+            records += sample_vcf_record_count(file.file, size)
+    return RequestCost(
+        records=records,
+        memory_bytes=REQUEST_BASE_MEMORY + records * BYTES_PER_RECORD,
+        cpu_seconds=records * CPU_SECONDS_PER_RECORD,
+    )
+
+
+class AdmissionController:
+    """
+    Kontrola przyjmowania zapytań według budżetu pamięci procesu. Zapytanie jest wpuszczane,
+    gdy jego szacowany koszt mieści się w wolnym budżecie; w przeciwnym razie czeka w kolejce
+    FIFO (co najwyżej max_queue zapytań, najdłużej queue_timeout sekund) albo jest odrzucane.
+    admit() blokuje wątek - wywołujemy go z puli wątków, nie z pętli zdarzeń.
+    """
+
+    def __init__(self, memory_budget=None, max_queue=ADMISSION_MAX_QUEUE, queue_timeout=ADMISSION_QUEUE_TIMEOUT):
+        self.memory_budget = memory_budget or ADMISSION_MEMORY_BUDGET_MB * 1024 * 1024
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self._condition = threading.Condition()
+        self._queue = deque()
+        self._memory_in_use = 0
+        self._cpu_in_flight = 0.0
+        self._active = 0
+        self._admitted = 0
+        self._rejected = Counter()
+
+    def _fits(self, cost):
+        return self._memory_in_use + cost.memory_bytes <= self.memory_budget
+
+    def _reject(self, reason, status_code, detail, retry_after=None):
+        self._rejected[reason] += 1
+        raise AdmissionRejected(status_code, detail, retry_after)
+
+    def retry_after(self):
+        # Szacowany czas do zwolnienia budżetu: pozostała praca CPU zapytań w toku
+        return max(1, math.ceil(self._cpu_in_flight))
+
+    @contextmanager
+    def admit(self, cost):
+        with self._condition:
+            if cost.memory_bytes > self.memory_budget:
+                self._reject(
+                    "too_large",
+                    413,
+                    f"Upload needs ~{cost.memory_bytes // 2**20} MiB, above the {self.memory_budget // 2**20} MiB worker budget.",
+                )
+            # Kolejka FIFO - nowe zapytanie nie wyprzedza czekających, nawet jeśli samo by się zmieściło
+            if self._queue or not self._fits(cost):
+                self._wait_for_budget(cost)
+            self._memory_in_use += cost.memory_bytes
+            self._cpu_in_flight += cost.cpu_seconds
+            self._active += 1
+            self._admitted += 1
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._memory_in_use -= cost.memory_bytes
+                self._cpu_in_flight -= cost.cpu_seconds
+                self._active -= 1
+                self._condition.notify_all()
+
+    def _wait_for_budget(self, cost):
+        if len(self._queue) >= self.max_queue:
+            self._reject("queue_full", 503, "Too many analyses in progress, retry later.", self.retry_after())
+        ticket = object()
+        self._queue.append(ticket)
+        deadline = time.monotonic() + self.queue_timeout
+        try:
+            while self._queue[0] is not ticket or not self._fits(cost):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._reject("timeout", 503, "Timed out waiting for worker memory, retry later.", self.retry_after())
+                self._condition.wait(remaining)
+        finally:
+            self._queue.remove(ticket)
+            self._condition.notify_all()
+
+    def metrics(self):
+        with self._condition:
+            return {
+                "memory_budget_bytes": self.memory_budget,
+                "memory_in_use_bytes": self._memory_in_use,
+                "active_requests": self._active,
+                "queue_depth": len(self._queue),
+                "admitted_total": self._admitted,
+                "rejected_total": sum(self._rejected.values()),
+                "rejected": dict(self._rejected),
+            }
@@ -1,14 +1,45 @@
+import numpy as np
 import pandas as pd
-from cyvcf2 import VCF
-from ..services.report_generation import generate_report
-from ..database.data_store import clinvar_df, gwas_df
+from ..config import ANALYSIS_WORKERS, SHARDING_MIN_VARIANTS
+from ..services.reference_blocks import ReferenceBlockIndex, DEFAULT_MIN_GQ, REFERENCE_BLOCK_ALTS
+from ..utils.helpers import decode_genotypes
+from ..database.data_store import get_clinvar_df, get_gwas_df
+import multiprocessing
 import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import lru_cache
 
+LD_BLOCKS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "pyrho_EUR_LD_blocks.bed")
+VCF_EXTENSIONS = (".vcf", ".vcf.gz")
+# Minimalna jakość wariantu (QUAL) brana do analizy
+MIN_QUAL = 50
+# Tabele wariantów w formacie kolumnowym (Parquet, Arrow IPC plik/strumień)
+COLUMNAR_EXTENSIONS = (".parquet", ".arrow", ".arrows", ".feather", ".ipc")
 
-def process_vcf_file(file) -> pd.DataFrame:
-    vcf_reader = VCF(file.file)
+
+def process_gvcf_file(file):
+    """
+    Wczytuje plik VCF/gVCF. Zwraca (warianty, ReferenceBlockIndex) - bloki referencyjne gVCF
+    (rekordy z INFO/END i tylko ALT <NON_REF>) trafiają do kompaktowego indeksu przedziałów.
+    """
+    # cyvcf2 jest importowany dopiero przy pierwszym pliku VCF (szybszy start aplikacji)
+    from cyvcf2 import VCF
+
+    # Obsługa zarówno UploadFile (FastAPI), jak i ścieżki do pliku (tryb wsadowy)
+    source = file.file if hasattr(file, "file") else str(file)
+    vcf_reader = VCF(source)
     variants = []
+    block_chroms, block_starts, block_ends, block_gqs = [], [], [], []
     for record in vcf_reader:
+            if len(record.ALT) == 1 and record.ALT[0] in REFERENCE_BLOCK_ALTS and record.INFO.get("END") is not None:
+                block_chroms.append(record.CHROM)
+                block_starts.append(record.POS)
+                block_ends.append(record.INFO.get("END"))
+                gq = record.gt_quals
+                block_gqs.append(float(gq.min()) if gq is not None and len(gq) else 0.0)
+                continue
             chrom = record.CHROM
             pos = record.POS
             ref = record.REF
@@ -18,9 +49,102 @@ def process_vcf_file(file) -> pd.DataFrame:
             variants.append([chrom, pos, ref, alt, qual, genotypes])
 
     df = pd.DataFrame(variants, columns=["CHROM", "POS", "REF", "ALT", "QUAL", "GENOTYPES"])
+    reference_blocks = ReferenceBlockIndex.from_records(block_chroms, block_starts, block_ends, block_gqs)
+    return filter_variants(df), reference_blocks
+
+def process_vcf_file(file) -> pd.DataFrame:
+    variants, _ = process_gvcf_file(file)
+    return variants
+
+def is_supported_variant_file(filename) -> bool:
+    return str(filename).endswith(VCF_EXTENSIONS + COLUMNAR_EXTENSIONS)
+
+def process_variant_file(file):
+    """
+    Wczytuje plik wariantów pacjenta: VCF/gVCF albo tabelę kolumnową (Parquet/Arrow IPC).
+    Zwraca (warianty, ReferenceBlockIndex); tabele kolumnowe nie zawierają bloków referencyjnych.
+    """
+    filename = getattr(file, "filename", None) or str(file)
+    if filename.endswith(COLUMNAR_EXTENSIONS):
+        return process_columnar_file(file), ReferenceBlockIndex()
+    return process_gvcf_file(file)
+
+def read_variant_table(file):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    filename = getattr(file, "filename", None) or str(file)
+    if hasattr(file, "file"):
+        # UploadFile - Arrow czyta bezpośrednio z pliku tymczasowego (bez kopii całego uploadu w bytes)
+        source = pa.PythonFile(file.file, mode="r")
+    else:
+        # Plik na dysku - mapowanie pamięci, kolumny liczbowe bez kopiowania
+        source = pa.memory_map(str(file))
+
+    if filename.endswith(".parquet"):
+        return pq.read_table(source)
+    try:
+        return pa.ipc.open_file(source).read_all()
+    except pa.ArrowInvalid:
+        # Format strumieniowy Arrow IPC (.arrows)
+        source.seek(0)
+        return pa.ipc.open_stream(source).read_all()
+
+def validate_variant_schema(table):
+    """Sprawdza, czy tabela ma kolumny CHROM, POS, REF, ALT, QUAL, GENOTYPES o właściwych typach."""
+    import pyarrow.types as pa_types
+
+    def is_string(data_type):
+        if pa_types.is_dictionary(data_type):
+            data_type = data_type.value_type
+        return pa_types.is_string(data_type) or pa_types.is_large_string(data_type)
+
+    def is_list(data_type):
+        return pa_types.is_list(data_type) or pa_types.is_large_list(data_type)
+
+    checks = {
+        "CHROM": is_string,
+        "POS": pa_types.is_integer,
+        "REF": is_string,
+        "ALT": lambda t: is_string(t) or (is_list(t) and is_string(t.value_type)),
+        "QUAL": lambda t: pa_types.is_floating(t) or pa_types.is_integer(t) or pa_types.is_null(t),
+        "GENOTYPES": lambda t: is_list(t) and is_list(t.value_type) and (
+            pa_types.is_integer(t.value_type.value_type) or pa_types.is_boolean(t.value_type.value_type)
+        ),
+    }
+    missing = [column for column in checks if column not in table.column_names]
+    if missing:
+        raise ValueError(f"Variant table is missing columns: {', '.join(missing)}")
+    invalid = [
+        f"{column} ({table.schema.field(column).type})"
+        for column, check in checks.items()
+        if not check(table.schema.field(column).type)
+    ]
+    if invalid:
+        raise ValueError(f"Variant table has invalid column types: {', '.join(invalid)}")
+    if table.column("POS").null_count or table.column("CHROM").null_count:
+        raise ValueError("Variant table has missing CHROM or POS values.")
+    return table.select(list(checks))
+
+def process_columnar_file(file) -> pd.DataFrame:
+    """
+    Wczytuje warianty z tabeli Parquet/Arrow o zdefiniowanym schemacie (bez dekodowania VCF).
+    Filtr QUAL jest stosowany jeszcze w Arrow, więc do list Pythona (genotypy [a1, a2, phased],
+    potrzebne w obliczeniach PRS) konwertowane są tylko warianty, które przechodzą filtr.
+    """
+    import pyarrow.compute as pc
 
+    table = validate_variant_schema(read_variant_table(file))
+    table = table.filter(pc.greater_equal(table.column("QUAL"), MIN_QUAL))
+    df = table.drop_columns(["ALT", "GENOTYPES"]).to_pandas(split_blocks=True)
+    df["CHROM"] = df["CHROM"].astype(str)
+    df["ALT"] = table.column("ALT").to_pylist()
+    df["GENOTYPES"] = [decode_genotypes(genotypes) for genotypes in table.column("GENOTYPES").to_pylist()]
+    return filter_variants(df[["CHROM", "POS", "REF", "ALT", "QUAL", "GENOTYPES"]])
+
+def filter_variants(df: pd.DataFrame) -> pd.DataFrame:
     # filter out variants with low QUAL scores
-    high_quality_variants = df[df["QUAL"] >= 50]
+    high_quality_variants = df[df["QUAL"] >= MIN_QUAL]
     # Przekształcenie wartości ALT na listy, jeśli są zapisane jako stringi rozdzielone przecinkami
     high_quality_variants["ALT"] = high_quality_variants["ALT"].apply(lambda x: x.split(",") if isinstance(x, str) else x)
 
@@ -28,97 +152,286 @@ def process_vcf_file(file) -> pd.DataFrame:
     high_quality_variants = high_quality_variants.explode("ALT")
 
     # Zamiana "<NON_REF>" na None
-    high_quality_variants["ALT"] = high_quality_variants["ALT"].apply(lambda x: x if x != "<NON_REF>" else None)
+    high_quality_variants["ALT"] = high_quality_variants["ALT"].apply(lambda x: x if x not in REFERENCE_BLOCK_ALTS else None)
 
     # Usunięcie wierszy, gdzie ALT ma wartość None
     high_quality_variants = high_quality_variants.dropna(subset=["ALT"])
 
     return high_quality_variants
 
-def perform_full_analysis(combined_variants: pd.DataFrame):
+def analyse_variants(combined_variants: pd.DataFrame, output_dir="generated_reports", reference_blocks=None, workers=None):
+    workers = ANALYSIS_WORKERS if workers is None else workers
+    if workers > 1 and shard_pool_ready() and len(combined_variants) >= SHARDING_MIN_VARIANTS:
+        # Duże pliki - równoległa analiza w podziale na chromosomy (pula utworzona przy starcie procesu)
+        return analyse_variants_sharded(combined_variants, output_dir=output_dir, reference_blocks=reference_blocks)
+
     # Dopasowanie do ClinVar
-    merged_clinvar_variants = merge_clinvar_variants(combined_variants, clinvar_df)
+    merged_clinvar_variants = merge_clinvar_variants(combined_variants, get_clinvar_df(), output_dir=output_dir)
 
     # Dopasowanie do GWAS
-    prs_scores = merge_gwas_variants(combined_variants, gwas_df)
+    prs_scores = merge_gwas_variants(combined_variants, get_gwas_df(), output_dir=output_dir, reference_blocks=reference_blocks)
+
+    return merged_clinvar_variants, prs_scores
+
+def perform_full_analysis(combined_variants: pd.DataFrame, output_dir="generated_reports", reference_blocks=None, workers=None):
+    merged_clinvar_variants, prs_scores = analyse_variants(
+        combined_variants, output_dir=output_dir, reference_blocks=reference_blocks, workers=workers
+    )
 
     # Upewnienie się, że katalog raportów istnieje
-    output_dir = "generated_reports"
     os.makedirs(output_dir, exist_ok=True)
 
-    # Generowanie jednego raportu PDF
+    # Generowanie jednego raportu PDF (reportlab jest importowany dopiero tutaj)
+    from ..services.report_generation import generate_report
     report_path = os.path.join(output_dir, "medical_report.pdf")
     generate_report(merged_clinvar_variants, prs_scores, report_path)
     
     return report_path
 
-
-
-
-def merge_clinvar_variants(patient_df, clinvar_df):
-    matched_variants = pd.merge(patient_df, clinvar_df, on=["CHROM", "POS", "REF", "ALT"], how="inner")
+def save_result_csv(df, output_dir, file_name):
+    # Bez katalogu (np. odpowiedzi strumieniowe) nie zapisujemy pliku CSV
+    if output_dir is None:
+        return
 
     # Upewnienie się, że katalog raportów istnieje
-    output_dir = "generated_reports"
     os.makedirs(output_dir, exist_ok=True)
+    df.to_csv(os.path.join(output_dir, file_name), index=False)
 
-    # Generowanie jednego raportu PDF
-    clinvar_path = os.path.join(output_dir, "matched_variants.csv")
+def merge_clinvar_variants(patient_df, clinvar_df, output_dir="generated_reports"):
+    matched_variants = pd.merge(patient_df, clinvar_df, on=["CHROM", "POS", "REF", "ALT"], how="inner")
 
-    matched_variants.to_csv(clinvar_path, index=False)
+    save_result_csv(matched_variants, output_dir, "matched_variants.csv")
     return matched_variants
 
-def merge_gwas_variants(patient_df, gwas_df):
-    gwas_filtered = gwas_df[['CHR_ID', 'CHR_POS', 'SNP_ID_CURRENT', 'DISEASE/TRAIT', 'P-VALUE', 'OR or BETA', 'MAPPED_GENE']]
-    gwas_filtered = gwas_filtered.rename(columns={"CHR_ID": "CHROM", "CHR_POS": "POS"})
-
-    gwas_filtered["CHROM"] = gwas_filtered["CHROM"].astype(str)
-    gwas_filtered["WEIGHT"] = pd.to_numeric(gwas_filtered["OR or BETA"], errors='coerce')
-    gwas_filtered["POS"] = pd.to_numeric(gwas_filtered["POS"], errors="coerce").astype("Int64")
+def merge_gwas_variants(patient_df, gwas_df, output_dir="generated_reports", p_value_threshold=5e-8,
+                        reference_blocks=None, min_gq=DEFAULT_MIN_GQ):
+    gwas_filtered = prepare_gwas_table(gwas_df)
     patient_df["POS"] = patient_df["POS"].astype("Int64")
 
-    mean_prs = calculate_mean_prs(gwas_df)
+    mean_prs, missing_sites = calculate_expected_prs(
+        patient_df, gwas_df, gwas_filtered, p_value_threshold, reference_blocks, min_gq
+    )
+    trait_prs = score_gwas_matches(patient_df, gwas_filtered, load_ld_blocks(), p_value_threshold)
+    prs_scores = summarize_prs(trait_prs, mean_prs, missing_sites)
+
+    save_result_csv(prs_scores, output_dir, "prs_scores.csv")
+    return prs_scores
+
+def prepare_gwas_table(gwas_df):
+    gwas_filtered = gwas_df[['CHR_ID', 'CHR_POS', 'SNP_ID_CURRENT', 'DISEASE/TRAIT', 'P-VALUE', 'OR or BETA', 'MAPPED_GENE']]
+    gwas_filtered = gwas_filtered.rename(columns={"CHR_ID": "CHROM", "CHR_POS": "POS"})
+    # Pozycje jednej asocjacji (rozdzielone w load_gwas_to_db) mają wspólny identyfikator;
+    # w surowym katalogu każdy wiersz jest osobną asocjacją
+    gwas_filtered["ASSOCIATION_ID"] = gwas_df["ASSOCIATION_ID"] if "ASSOCIATION_ID" in gwas_df.columns else np.arange(len(gwas_df))
+
+    # Katalog z load_gwas_to_db ma już właściwe typy - konwertujemy tylko surowe dane
+    if not pd.api.types.is_string_dtype(gwas_filtered["CHROM"]):
+        gwas_filtered["CHROM"] = gwas_filtered["CHROM"].astype(str)
+    gwas_filtered["WEIGHT"] = to_numeric_column(gwas_filtered["OR or BETA"])
+    gwas_filtered["POS"] = to_numeric_column(gwas_filtered["POS"]).astype("Int64")
+    return gwas_filtered
+
+def calculate_expected_prs(patient_df, gwas_df, gwas_filtered, p_value_threshold, reference_blocks=None, min_gq=DEFAULT_MIN_GQ):
+    """Zwraca (mean_prs, MISSING_SITES) dla każdej cechy; MISSING_SITES tylko przy blokach gVCF."""
+    missing_sites = None
+    if reference_blocks is None:
+        mean_prs = calculate_mean_prs(gwas_df, threshold=p_value_threshold)
+    else:
+        # Z blokami gVCF odróżniamy pewny hom-ref (dawka 0) od braku wywołania - pozycje
+        # bez wywołania nie wchodzą do oczekiwanego PRS i są raportowane jako MISSING_SITES
+        significant = (gwas_filtered["P-VALUE"] < p_value_threshold).to_numpy()
+        scoring_sites = gwas_filtered[significant]
+        dosages = score_site_dosages(scoring_sites, patient_df, reference_blocks, min_gq)
+        mean_prs = calculate_mean_prs(gwas_df[significant][dosages.notna().to_numpy()], threshold=p_value_threshold)
+        missing_sites = dosages.isna().groupby(scoring_sites["DISEASE/TRAIT"], observed=True).sum().rename("MISSING_SITES")
     # change name of the column Weight to mean_prs
-    mean_prs = mean_prs.rename("mean_prs")
-     
+    return mean_prs.rename("mean_prs"), missing_sites
+
+def clump_gwas_matches(patient_df, gwas_filtered, ld_blocks, p_value_threshold=5e-8):
+    """Dopasowanie do GWAS i clumping po blokach LD; zwraca reprezentatywne SNP z liczbą alleli ryzyka."""
     merged_data = pd.merge(patient_df, gwas_filtered, on=["CHROM", "POS"], how="inner")
 
-    threshold = 5e-8  # Standardowy próg istotności genome-wide
-    filtered_data = merged_data[merged_data["P-VALUE"] < threshold]
+    # Domyślnie standardowy próg istotności genome-wide (5e-8)
+    filtered_data = merged_data[merged_data["P-VALUE"] < p_value_threshold]
 
-    ld_blocks = pd.read_csv(
-    "app/services/pyrho_EUR_LD_blocks.bed",
-    sep="\t",
-    header=None,
-    names=["chromosome", "start", "end"],
-    dtype={"chromosome": str, "start": "Int64", "end": "Int64"},  # Definicja typów
-    skiprows=1  # Pominięcie nagłówka
-    )
-    ld_blocks["chromosome"] = ld_blocks["chromosome"].str.replace("chr", "")  # Usunięcie "chr" z nazwy chromosomu
-     
     clumped_snps = clumping_by_ld(filtered_data, ld_blocks)
-
-     
-    clumped_snps["allele_count"] = clumped_snps["GENOTYPES"].apply(calculate_allele_count)
-    prs_scores = clumped_snps.groupby("DISEASE/TRAIT").apply(calculate_prs_for_trait).reset_index()
-    prs_scores.columns = ["DISEASE/TRAIT", "PRS"]
+    if not clumped_snps.empty:
+        clumped_snps["allele_count"] = clumped_snps["GENOTYPES"].apply(calculate_allele_count)
+    return clumped_snps
+
+def sum_trait_prs(clumped_snps):
+    """Suma wkładów PRS dla każdej cechy; asocjacja z wieloma pozycjami liczy się raz."""
+    if clumped_snps.empty:
+        return pd.Series(dtype=float, name="PRS")
+    # Pozycje haplotypu/interakcji mogą trafić do różnych bloków LD - bierzemy tę z największą liczbą alleli
+    clumped_snps = clumped_snps.sort_values("allele_count", ascending=False, kind="stable").drop_duplicates("ASSOCIATION_ID")
+    # observed=True - DISEASE/TRAIT jest kategoryczny; w pandas 2.x bez tego zwracane byłyby wszystkie cechy katalogu
+    return clumped_snps.groupby("DISEASE/TRAIT", observed=True).apply(calculate_prs_for_trait).rename("PRS")
+
+def score_gwas_matches(patient_df, gwas_filtered, ld_blocks, p_value_threshold=5e-8):
+    """Dopasowanie do GWAS, clumping po blokach LD i suma wkładów PRS dla każdej cechy."""
+    return sum_trait_prs(clump_gwas_matches(patient_df, gwas_filtered, ld_blocks, p_value_threshold))
+
+def summarize_prs(trait_prs, mean_prs, missing_sites=None):
+    prs_scores = pd.DataFrame({"DISEASE/TRAIT": trait_prs.index.astype(object), "PRS": trait_prs.to_numpy()})
 
     prs_scores = prs_scores.sort_values(by="PRS", ascending=False)
     prs_scores = prs_scores.merge(mean_prs, left_on="DISEASE/TRAIT", right_index=True, how="inner")
+
+    if missing_sites is not None:
+        prs_scores = prs_scores.merge(missing_sites, left_on="DISEASE/TRAIT", right_index=True, how="left")
      
     prs_scores = calculate_z_scores(prs_scores)
     prs_scores = classify_risk(prs_scores)
+    return prs_scores
 
-    # Upewnienie się, że katalog raportów istnieje
-    output_dir = "generated_reports"
-    os.makedirs(output_dir, exist_ok=True)
-
-    # Generowanie jednego raportu PDF
-    gwas_path = os.path.join(output_dir, "prs_scores.csv")
-
-    prs_scores.to_csv(gwas_path, index=False)
+@lru_cache(maxsize=None)
+def load_ld_blocks():
+    # Bloki LD są wczytywane raz na proces
+    ld_blocks = pd.read_csv(
+    LD_BLOCKS_PATH,
+    sep="\t",
+    header=None,
+    names=["chromosome", "start", "end"],
+    dtype={"chromosome": str, "start": "Int64", "end": "Int64"},  # Definicja typów
+    skiprows=1  # Pominięcie nagłówka
+    )
+    ld_blocks["chromosome"] = ld_blocks["chromosome"].str.replace("chr", "")  # Usunięcie "chr" z nazwy chromosomu
+    return ld_blocks
+
+# Dane referencyjne podzielone na chromosomy, dostępne w procesach roboczych
+_shard_references = {}
+# Stan puli w procesie głównym
+_shard_pool = None
+_shard_pool_lock = threading.Lock()
+_shard_chromosomes = frozenset()
+_shard_gwas_table = None
+
+def partition_reference_data(clinvar_df, gwas_filtered, ld_blocks):
+    """Dzieli ClinVar, GWAS i bloki LD na partycje według chromosomu."""
+    partitions = {}
+    for name, df, column in (("clinvar", clinvar_df, "CHROM"), ("gwas", gwas_filtered, "CHROM"), ("ld", ld_blocks, "chromosome")):
+        for chrom, part in df.groupby(df[column].astype(str), sort=False):
+            partitions.setdefault(chrom, {})[name] = part
+    empty = {"clinvar": clinvar_df.iloc[0:0], "gwas": gwas_filtered.iloc[0:0], "ld": ld_blocks.iloc[0:0]}
+    return {chrom: {**empty, **parts} for chrom, parts in partitions.items()}
+
+def init_shard_worker(references):
+    global _shard_references
+    _shard_references = references
+
+def analyse_shard(chrom, patient_shard, p_value_threshold=5e-8):
+    """Analiza jednego chromosomu: dopasowanie do ClinVar i reprezentatywne SNP z GWAS."""
+    references = _shard_references[chrom]
+    matched_variants = merge_clinvar_variants(patient_shard, references["clinvar"], output_dir=None)
+    patient_shard = patient_shard.astype({"POS": "Int64"})
+    clumped_snps = clump_gwas_matches(patient_shard, references["gwas"], references["ld"], p_value_threshold)
+    if not clumped_snps.empty:
+        clumped_snps = clumped_snps[["ASSOCIATION_ID", "DISEASE/TRAIT", "WEIGHT", "allele_count"]]
+    return matched_variants, clumped_snps
+
+def get_shard_pool(workers):
+    """
+    Pula procesów do analizy chromosomów, tworzona raz na proces (w API - w lifespan, przed
+    startem innych wątków; nigdy z wątku zapytania). Przy starcie przez fork partycje danych
+    referencyjnych są dziedziczone (copy-on-write), a nie kopiowane.
+    """
+    global _shard_pool, _shard_chromosomes, _shard_gwas_table
+    with _shard_pool_lock:
+        if _shard_pool is None:
+            _shard_gwas_table = prepare_gwas_table(get_gwas_df())
+            references = partition_reference_data(get_clinvar_df(), _shard_gwas_table, load_ld_blocks())
+            _shard_chromosomes = frozenset(references)
+            start_methods = multiprocessing.get_all_start_methods()
+            context = multiprocessing.get_context("fork" if "fork" in start_methods else None)
+            _shard_pool = ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=context,
+                initializer=init_shard_worker,
+                initargs=(references,),
+            )
+            # Procesy powstają przy pierwszym zleceniu - uruchamiamy je od razu, aby fork
+            # nastąpił tutaj, a nie przy pierwszym zapytaniu
+            _shard_pool.submit(os.getpid).result()
+        return _shard_pool
+
+def shard_pool_ready():
+    return _shard_pool is not None
+
+def reset_shard_pool():
+    """Zamyka pulę (np. po śmierci procesu roboczego); kolejne zapytania są analizowane w jednym procesie."""
+    global _shard_pool
+    with _shard_pool_lock:
+        pool, _shard_pool = _shard_pool, None
+    if pool is not None:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+def run_shards(pool, combined_variants, reference_blocks=None, p_value_threshold=5e-8):
+    futures = [
+        pool.submit(analyse_shard, chrom, patient_shard, p_value_threshold)
+        for chrom, patient_shard in combined_variants.groupby(combined_variants["CHROM"].astype(str), sort=False)
+        if chrom in _shard_chromosomes
+    ]
+    # mean_prs i MISSING_SITES są liczone globalnie (wektorowo) w procesie głównym
+    mean_prs, missing_sites = calculate_expected_prs(
+        combined_variants.astype({"POS": "Int64"}), get_gwas_df(), _shard_gwas_table, p_value_threshold, reference_blocks
+    )
 
-    return prs_scores
+    shard_results = [future.result() for future in futures]
+    matched_variants = pd.concat(
+        [matches for matches, _ in shard_results] or [merge_clinvar_variants(combined_variants.iloc[0:0], get_clinvar_df(), output_dir=None)],
+        ignore_index=True,
+    )
+    # PRS jest sumowany dopiero po połączeniu chromosomów - asocjacja z pozycjami na różnych
+    # chromosomach (interakcje) liczy się raz
+    clumped_snps = [clumped for _, clumped in shard_results if not clumped.empty]
+    trait_prs = sum_trait_prs(pd.concat(clumped_snps, ignore_index=True) if clumped_snps else pd.DataFrame())
+    return matched_variants, summarize_prs(trait_prs, mean_prs, missing_sites)
+
+def analyse_variants_sharded(combined_variants, output_dir="generated_reports", reference_blocks=None,
+                             p_value_threshold=5e-8):
+    """
+    Równoległa wersja analyse_variants: warianty pacjenta są dzielone według chromosomu,
+    każdy chromosom jest analizowany w osobnym procesie, a wyniki są łączone na końcu
+    (sumy PRS dla każdej cechy są sumowane między chromosomami).
+    """
+    pool = _shard_pool
+    if pool is None:
+        # Pula nie działa (nie została uruchomiona lub zginęła) - analiza w jednym procesie
+        return analyse_variants(combined_variants, output_dir=output_dir, reference_blocks=reference_blocks, workers=1)
+    try:
+        matched_variants, prs_scores = run_shards(pool, combined_variants, reference_blocks, p_value_threshold)
+    except BrokenProcessPool as e:
+        # Proces roboczy zginął (np. OOM killer). Puli nie tworzymy ponownie z wątku zapytania
+        # (fork z procesu wielowątkowego) - kolejne zapytania działają w jednym procesie,
+        # a /ready zgłasza brak gotowości, aby orkiestrator zrestartował workera
+        print(f"Shard pool broken ({e}), analysing in a single process.")
+        reset_shard_pool()
+        return analyse_variants(combined_variants, output_dir=output_dir, reference_blocks=reference_blocks, workers=1)
+
+    save_result_csv(matched_variants, output_dir, "matched_variants.csv")
+    save_result_csv(prs_scores, output_dir, "prs_scores.csv")
+    return matched_variants, prs_scores
+
+def to_numeric_column(column):
+    if pd.api.types.is_numeric_dtype(column):
+        return column
+    return pd.to_numeric(column, errors="coerce")
+
+def score_site_dosages(sites, patient_df, reference_blocks, min_gq=DEFAULT_MIN_GQ):
+    """
+    Dawka allelu ryzyka dla każdej pozycji GWAS: liczba alleli dla wariantów pacjenta,
+    0 dla pozycji w bloku referencyjnym gVCF o GQ >= min_gq, NaN gdy pozycja nie ma wywołania.
+    """
+    variant_dosages = (
+        patient_df.assign(dosage=patient_df["GENOTYPES"].apply(calculate_allele_count))
+        .groupby(["CHROM", "POS"])["dosage"].max()
+    )
+    site_keys = pd.MultiIndex.from_arrays([sites["CHROM"], sites["POS"]])
+    dosages = variant_dosages.reindex(site_keys).to_numpy(dtype=float, na_value=np.nan, copy=True)
+    hom_ref = reference_blocks.lookup(sites["CHROM"], sites["POS"], min_gq)
+    dosages[np.isnan(dosages) & hom_ref] = 0
+    return pd.Series(dosages, index=sites.index)
 
 # Funkcja do obliczania liczby alleli ryzyka
 def calculate_allele_count(genotype):
@@ -136,17 +449,20 @@ def calculate_prs_for_trait(df):
     df["prs_contribution"] = df["WEIGHT"] * df["allele_count"]  # Obliczamy wkład PRS dla każdej pozycji
     return df["prs_contribution"].sum()
 
-def calculate_mean_prs(gwas_data, mean_genotype=1):
+def calculate_mean_prs(gwas_data, mean_genotype=1, threshold=5e-8):
     """
     Oblicza średnie PRS na podstawie istotnych SNP z GWAS dla każdej choroby.
     """
     # Filtrowanie SNP po p-value
-    threshold = 5e-8
     filtered_gwas_data = gwas_data[gwas_data["P-VALUE"] < threshold]
 
+    # Asocjacja rozdzielona na kilka pozycji (haplotyp, interakcja) liczy się raz
+    if "ASSOCIATION_ID" in filtered_gwas_data.columns:
+        filtered_gwas_data = filtered_gwas_data.drop_duplicates("ASSOCIATION_ID")
+
     # Obliczenie mean_PRS
-    filtered_gwas_data["Weight"] = pd.to_numeric(filtered_gwas_data["OR or BETA"], errors="coerce")
-    mean_prs = filtered_gwas_data.groupby("DISEASE/TRAIT")["Weight"].sum() * mean_genotype
+    filtered_gwas_data["Weight"] = to_numeric_column(filtered_gwas_data["OR or BETA"])
+    mean_prs = filtered_gwas_data.groupby("DISEASE/TRAIT", observed=True)["Weight"].sum() * mean_genotype
 
     return mean_prs
 
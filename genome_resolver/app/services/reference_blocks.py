@@ -0,0 +1,100 @@
+import numpy as np
+import pandas as pd
+
+# Minimalna jakość genotypu (GQ), przy której blok referencyjny traktujemy jako pewny hom-ref
+DEFAULT_MIN_GQ = 20
+# ALT oznaczające blok referencyjny w gVCF (GATK: <NON_REF>, bcftools/DeepVariant: <*>)
+REFERENCE_BLOCK_ALTS = ("<NON_REF>", "<*>")
+
+
+class ReferenceBlockIndex:
+    """
+    Bloki referencyjne gVCF (rekordy z INFO/END) jako posortowane tablice przedziałów
+    (start, end, min GQ) dla każdego chromosomu. Bloki nigdy nie są rozwijane do
+    pojedynczych pozycji - pamięć rośnie z liczbą bloków, a nie z długością genomu.
+    """
+
+    def __init__(self, blocks=None):
+        # chromosom -> (starts, ends, min_gq), posortowane po start
+        self.blocks = blocks or {}
+
+    @classmethod
+    def from_records(cls, chroms, starts, ends, min_gqs):
+        frame = pd.DataFrame({
+            "CHROM": pd.Series(chroms, dtype=object).astype(str),
+            "START": np.asarray(starts, dtype=np.int64),
+            "END": np.asarray(ends, dtype=np.int64),
+            "MIN_GQ": np.asarray(min_gqs, dtype=np.float32),
+        })
+        blocks = {}
+        for chrom, chrom_blocks in frame.groupby("CHROM", sort=False):
+            chrom_blocks = chrom_blocks.sort_values("START", kind="stable")
+            blocks[chrom] = (
+                chrom_blocks["START"].to_numpy(),
+                chrom_blocks["END"].to_numpy(),
+                chrom_blocks["MIN_GQ"].to_numpy(),
+            )
+        return cls(blocks)
+
+    @classmethod
+    def concat(cls, indexes):
+        """Łączy bloki z kilku plików (np. kilka gVCF jednego pacjenta)."""
+        chroms, starts, ends, min_gqs = [], [], [], []
+        for index in indexes:
+            for chrom, (chrom_starts, chrom_ends, chrom_gqs) in index.blocks.items():
+                chroms.extend([chrom] * len(chrom_starts))
+                starts.append(chrom_starts)
+                ends.append(chrom_ends)
+                min_gqs.append(chrom_gqs)
+        if not chroms:
+            return cls()
+        return cls.from_records(chroms, np.concatenate(starts), np.concatenate(ends), np.concatenate(min_gqs))
+
+    def __len__(self):
+        return sum(len(starts) for starts, _, _ in self.blocks.values())
+
+    @classmethod
+    def from_frame(cls, frame):
+        return cls.from_records(frame["CHROM"], frame["START"], frame["END"], frame["MIN_GQ"])
+
+    def to_frame(self):
+        """Bloki jako tabela CHROM/START/END/MIN_GQ (np. do zapisu w Parquet)."""
+        frames = [
+            pd.DataFrame({"CHROM": chrom, "START": starts, "END": ends, "MIN_GQ": min_gqs})
+            for chrom, (starts, ends, min_gqs) in self.blocks.items()
+        ]
+        if not frames:
+            return pd.DataFrame({
+                "CHROM": pd.Series(dtype=object),
+                "START": pd.Series(dtype=np.int64),
+                "END": pd.Series(dtype=np.int64),
+                "MIN_GQ": pd.Series(dtype=np.float32),
+            })
+        return pd.concat(frames, ignore_index=True)
+
+    def lookup(self, chroms, positions, min_gq=DEFAULT_MIN_GQ):
+        """
+        Zwraca tablicę bool: True, jeśli pozycja leży w bloku referencyjnym o GQ >= min_gq.
+        Wyszukiwanie jest wektorowe (np.searchsorted) osobno dla każdego chromosomu.
+        """
+        chroms = pd.Series(chroms).astype(str).to_numpy()
+        positions = pd.Series(positions).astype("Int64").fillna(-1).to_numpy(dtype=np.int64)
+        covered = np.zeros(len(positions), dtype=bool)
+
+        for chrom, (starts, ends, min_gqs) in self.blocks.items():
+            mask = chroms == chrom
+            if not mask.any():
+                continue
+            confident = min_gqs >= min_gq
+            starts, ends = starts[confident], ends[confident]
+            if len(starts) == 0:
+                continue
+            # Bloki mogą się nakładać (kilka plików) - bierzemy największy koniec spośród bloków
+            # zaczynających się nie później niż dana pozycja
+            max_ends = np.maximum.accumulate(ends)
+            query = positions[mask]
+            block_index = np.searchsorted(starts, query, side="right") - 1
+            hit = block_index >= 0
+            hit[hit] = query[hit] <= max_ends[block_index[hit]]
+            covered[mask] = hit
+        return covered
@@ -0,0 +1,106 @@
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+# Pula renderująca procesu API (tworzona w lifespan)
+_render_service = None
+
+
+class RenderQueueFull(Exception):
+    """Kolejka renderowania jest pełna - klient powinien spróbować ponownie później."""
+
+
+def serialize_report_inputs(clinvar_df: pd.DataFrame, gwas_df: pd.DataFrame, summary_text: str = None) -> dict:
+    """
+    Zamienia wyniki analizy na słownik, który można przesłać do procesu renderującego.
+    Bez summary_text podsumowanie jest generowane w procesie renderującym.
+    """
+    return {
+        "clinvar": clinvar_df.to_dict(orient="split"),
+        "prs": gwas_df.to_dict(orient="split"),
+        "summary_text": summary_text,
+    }
+
+
+def render_report(payload: dict, output_file: str) -> str:
+    """Renderuje raport PDF w procesie roboczym na podstawie zserializowanych danych."""
+    # reportlab jest importowany tylko w procesach renderujących (szybszy start procesu API)
+    from ..services.report_generation import generate_report
+
+    clinvar_df = pd.DataFrame(**payload["clinvar"])
+    gwas_df = pd.DataFrame(**payload["prs"])
+    output_dir = os.path.dirname(output_file)
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+    generate_report(clinvar_df, gwas_df, output_file, summary_text=payload["summary_text"])
+    return output_file
+
+
+def init_render_worker():
+    from ..services.report_generation import register_fonts
+    register_fonts()
+
+
+class ReportRenderService:
+    """
+    Pula procesów renderujących raporty PDF (ReportLab jest ograniczony przez GIL).
+    Liczba zleceń w toku jest ograniczona przez max_pending - submit() blokuje,
+    dopóki nie zwolni się miejsce (backpressure) albo zgłasza RenderQueueFull po upływie timeout.
+    """
+
+    def __init__(self, workers=None, max_pending=None):
+        workers = workers or os.cpu_count() or 1
+        self.max_pending = max_pending or workers * 2
+        self._slots = threading.BoundedSemaphore(self.max_pending)
+        # Czcionka jest rejestrowana raz, przy starcie każdego procesu roboczego
+        self._executor = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=init_render_worker,
+        )
+
+    def submit(self, payload: dict, output_file: str, timeout=None):
+        if not self._slots.acquire(timeout=timeout):
+            raise RenderQueueFull(f"Render queue is full ({self.max_pending} pending reports).")
+        try:
+            future = self._executor.submit(render_report, payload, output_file)
+        except Exception:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return future
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.shutdown()
+
+
+def start_render_service(workers, max_pending=None):
+    """
+    Tworzy pulę renderującą procesu API (raz na proces). Procesy są uruchamiane przez spawn
+    przy pierwszym raporcie - start aplikacji na nie nie czeka.
+    """
+    global _render_service
+    if _render_service is None:
+        _render_service = ReportRenderService(workers=workers, max_pending=max_pending)
+    return _render_service
+
+
+def get_render_service():
+    """Zwraca pulę renderującą lub None, jeśli raporty są renderowane w procesie API."""
+    return _render_service
+
+
+def stop_render_service():
+    global _render_service
+    service, _render_service = _render_service, None
+    if service is not None:
+        service.shutdown(wait=False)
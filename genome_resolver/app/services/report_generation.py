@@ -13,12 +13,18 @@ from ..services.text_generation import (
     generate_summary_text,
 )
 
-# Rejestracja niestandardowej czcionki
-try:
-    pdfmetrics.registerFont(TTFont("DINCondensed", "app/services/DIN-Light.ttf"))
-except FileNotFoundError:
-    print("DIN-Light.ttf not found. Ensure the file exists at the specified path.")
-    raise
+FONT_NAME = "DINCondensed"
+FONT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "DIN-Light.ttf")
+
+def register_fonts():
+    """Rejestruje czcionkę DIN raz na proces (kolejne wywołania nic nie robią)."""
+    if FONT_NAME in pdfmetrics.getRegisteredFontNames():
+        return
+    try:
+        pdfmetrics.registerFont(TTFont(FONT_NAME, FONT_PATH))
+    except FileNotFoundError:
+        print("DIN-Light.ttf not found. Ensure the file exists at the specified path.")
+        raise
 
 class StyledTile(Flowable):
     def __init__(self, title, value, width=150, height=80, background_color="#356774", text_color="#edf6f9"):
@@ -63,7 +69,19 @@ def draw_background_on_page(c):
     c.setFillColor(HexColor("#83c5be"))
     c.rect(0, 0, letter[0], letter[1], stroke=0, fill=1)
 
-def generate_report(clinvar_df, gwas_df, output_file):
+def build_summary_text(clinvar_df, gwas_df):
+    """Podsumowanie z LLM dla wariantów patogennych (ClinVar) i cech wysokiego ryzyka (GWAS)."""
+    filtered_clinvar_df = clinvar_df[
+        clinvar_df['CLNSIG'].isin(['Pathogenic'])
+    ]
+    filtered_gwas_df = gwas_df[
+        gwas_df['Risk_Category'] == 'High Risk'
+    ]
+    return generate_summary_text(filtered_clinvar_df, filtered_gwas_df)
+
+def generate_report(clinvar_df, gwas_df, output_file, summary_text=None):
+    # Czcionka jest rejestrowana przy pierwszym raporcie w procesie (lub w lifespan aplikacji), nie przy imporcie
+    register_fonts()
     doc = SimpleDocTemplate(output_file, pagesize=letter)
     styles = getSampleStyleSheet()
 
@@ -100,11 +118,6 @@ def generate_report(clinvar_df, gwas_df, output_file):
     elements.append(Paragraph("ClinVar Section", section_title_style))
     elements.append(Spacer(1, 10))
 
-    # Filtracja wariantów ClinVar
-    filtered_clinvar_df = clinvar_df[
-        clinvar_df['CLNSIG'].isin(['Pathogenic'])
-    ]
-
     # Obliczenie kafli
     clinvar_counts = clinvar_df['CLNSIG'].value_counts()
     pathogenic_count = clinvar_counts.get("Pathogenic", 0)
@@ -167,11 +180,6 @@ def generate_report(clinvar_df, gwas_df, output_file):
     elements.append(Paragraph("GWAS Section", section_title_style))
     elements.append(Spacer(1, 10))
 
-    # Filtracja wariantów GWAS
-    filtered_gwas_df = gwas_df[
-        gwas_df['Risk_Category'] == 'High Risk'
-    ]
-
     # Obliczenie kafli
     gwas_counts = gwas_df['Risk_Category'].value_counts()
     high_risk_count = gwas_counts.get("High Risk", 0)
@@ -212,8 +220,9 @@ def generate_report(clinvar_df, gwas_df, output_file):
 
     # Podsumowanie
     elements.append(Paragraph("Summary", section_title_style))
-    summary_description = generate_summary_text(filtered_clinvar_df, filtered_gwas_df)
-    summary_description = summary_description.replace("\n", "<br/>")
+    if summary_text is None:
+        summary_text = build_summary_text(clinvar_df, gwas_df)
+    summary_description = summary_text.replace("\n", "<br/>")
     elements.append(Paragraph(summary_description, text_style))
 
     # Generowanie dokumentu z tłem
@@ -0,0 +1,83 @@
+import io
+import pandas as pd
+
+from ..utils.helpers import encode_genotypes
+
+DEFAULT_BATCH_SIZE = 10000
+
+
+def project_columns(df: pd.DataFrame, columns=None) -> pd.DataFrame:
+    """Zwraca tylko wybrane kolumny (w kolejności podanej przez klienta)."""
+    if not columns:
+        return df
+    missing = [column for column in columns if column not in df.columns]
+    if missing:
+        raise ValueError(f"Unknown columns: {', '.join(missing)}")
+    return df[list(columns)]
+
+
+def filter_clinvar_results(matched_variants: pd.DataFrame, clnsig=None) -> pd.DataFrame:
+    if not clnsig:
+        return matched_variants
+    return matched_variants[matched_variants["CLNSIG"].isin(clnsig)]
+
+
+def filter_prs_results(prs_scores: pd.DataFrame, risk_category=None) -> pd.DataFrame:
+    if not risk_category:
+        return prs_scores
+    return prs_scores[prs_scores["Risk_Category"].isin(risk_category)]
+
+
+def paginate(df: pd.DataFrame, offset=0, limit=None) -> pd.DataFrame:
+    if limit is None:
+        return df.iloc[offset:]
+    return df.iloc[offset:offset + limit]
+
+
+def iter_ndjson_batches(df: pd.DataFrame, batch_size=DEFAULT_BATCH_SIZE):
+    """Serializuje wynik partiami do NDJSON - jeden rekord JSON na linię."""
+    for start in range(0, len(df), batch_size):
+        chunk = df.iloc[start:start + batch_size].to_json(orient="records", lines=True)
+        if not chunk.endswith("\n"):
+            chunk += "\n"
+        yield chunk.encode("utf-8")
+
+
+def to_arrow_frame(df: pd.DataFrame) -> pd.DataFrame:
+    # Genotypy [a1, a2, phased] mieszają int i bool - Arrow wymaga jednolitego typu
+    if "GENOTYPES" in df.columns:
+        df = df.assign(GENOTYPES=df["GENOTYPES"].apply(encode_genotypes))
+    return df
+
+
+def iter_arrow_batches(df: pd.DataFrame, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Serializuje wynik jako strumień Arrow IPC. Każdy fragment ramki jest konwertowany
+    do RecordBatch dopiero w pętli - pierwszy batch jest wysyłany bez konwersji całości.
+    """
+    import pyarrow as pa
+
+    sink = io.BytesIO()
+
+    def drain():
+        chunk = sink.getvalue()
+        sink.seek(0)
+        sink.truncate()
+        return chunk
+
+    schema, writer = None, None
+    for start in range(0, len(df), batch_size):
+        chunk = to_arrow_frame(df.iloc[start:start + batch_size])
+        # Schemat strumienia ustala pierwszy fragment; kolejne są do niego rzutowane
+        batch = pa.RecordBatch.from_pandas(chunk, schema=schema, preserve_index=False)
+        if writer is None:
+            schema = batch.schema
+            writer = pa.ipc.new_stream(sink, schema)
+        writer.write_batch(batch)
+        yield drain()
+
+    if writer is None:
+        # Pusty wynik - strumień z samym schematem
+        writer = pa.ipc.new_stream(sink, pa.Schema.from_pandas(df, preserve_index=False))
+    writer.close()
+    yield drain()
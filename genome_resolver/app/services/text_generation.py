@@ -1,4 +1,3 @@
-import ollama
 from ..utils.helpers import dataframe_to_markdown_table
 import pandas as pd
 
@@ -13,11 +12,14 @@ def generate_summary_text(high_risks, pathologies):
         "Don't include sources of information, just the prevention actions."
     ).format(high_risks=high_risks, pathologies=pathologies)
 
+    # Import klienta ollama dopiero przy pierwszym wywołaniu (przyspiesza start aplikacji)
+    import ollama
     response = ollama.generate(model="monotykamary/medichat-llama3:latest", prompt=prompt)
     print(response["response"])
     return response["response"]
 
 def generate_test(text_input):
+    import ollama
     prompt = text_input
     response = ollama.generate(model="monotykamary/medichat-llama3:latest", prompt=prompt)
     print(response["response"])
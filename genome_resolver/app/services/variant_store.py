@@ -0,0 +1,191 @@
+import os
+import pandas as pd
+
+from ..utils.helpers import encode_genotypes, decode_genotypes
+from ..services.data_processing import (
+    merge_clinvar_variants,
+    merge_gwas_variants,
+    calculate_expected_prs,
+    prepare_gwas_table,
+    calculate_z_scores,
+    classify_risk
+)
+from ..services.reference_blocks import ReferenceBlockIndex
+
+VARIANT_KEY = ["CHROM", "POS", "REF", "ALT"]
+CLINVAR_ANNOTATIONS = ["CLNSIG", "GENEINFO", "DISEASE"]
+GWAS_COLUMNS = ["CHR_ID", "CHR_POS", "SNP_ID_CURRENT", "DISEASE/TRAIT", "P-VALUE", "OR or BETA", "MAPPED_GENE"]
+
+
+class VariantStore:
+    """
+    Przechowuje przetworzone warianty pacjentów (wynik process_vcf_file), bloki referencyjne
+    gVCF oraz ostatnie wyniki adnotacji w formacie Parquet:
+    <root>/<patient_id>/{variants,reference_blocks,clinvar,prs}.parquet
+    """
+
+    def __init__(self, root):
+        self.root = root
+
+    def _path(self, patient_id, name):
+        return os.path.join(self.root, patient_id, f"{name}.parquet")
+
+    def _write(self, patient_id, name, df):
+        os.makedirs(os.path.join(self.root, patient_id), exist_ok=True)
+        if "GENOTYPES" in df.columns:
+            df = df.assign(GENOTYPES=df["GENOTYPES"].apply(encode_genotypes))
+        df.reset_index(drop=True).to_parquet(self._path(patient_id, name), index=False)
+
+    def _read(self, patient_id, name):
+        df = pd.read_parquet(self._path(patient_id, name))
+        if "GENOTYPES" in df.columns:
+            df["GENOTYPES"] = df["GENOTYPES"].apply(
+                lambda genotypes: decode_genotypes(genotypes.tolist()) if genotypes is not None else None
+            )
+        return df
+
+    def patient_ids(self):
+        if not os.path.isdir(self.root):
+            return []
+        return sorted(
+            name for name in os.listdir(self.root)
+            if os.path.exists(self._path(name, "variants"))
+        )
+
+    def save_patient(self, patient_id, variants_df, reference_blocks=None):
+        self._write(patient_id, "variants", variants_df)
+        # Bloki gVCF są potrzebne, aby przy re-analizie PRS odróżnić hom-ref od braku wywołania
+        if reference_blocks is not None and len(reference_blocks):
+            self._write(patient_id, "reference_blocks", reference_blocks.to_frame())
+
+    def load_patient(self, patient_id):
+        return self._read(patient_id, "variants")
+
+    def load_reference_blocks(self, patient_id):
+        """Zwraca ReferenceBlockIndex pacjenta lub None, jeśli próbka nie pochodziła z gVCF."""
+        if not os.path.exists(self._path(patient_id, "reference_blocks")):
+            return None
+        return ReferenceBlockIndex.from_frame(self._read(patient_id, "reference_blocks"))
+
+    def save_results(self, patient_id, clinvar_matches, prs_scores):
+        self._write(patient_id, "clinvar", clinvar_matches)
+        self._write(patient_id, "prs", prs_scores)
+
+    def load_results(self, patient_id):
+        return self._read(patient_id, "clinvar"), self._read(patient_id, "prs")
+
+
+def diff_clinvar(old_clinvar, new_clinvar):
+    """Zwraca klucze wariantów (CHROM, POS, REF, ALT) dodanych, usuniętych lub ze zmienioną adnotacją."""
+    old = old_clinvar[VARIANT_KEY + CLINVAR_ANNOTATIONS].astype({"POS": "Int64"})
+    new = new_clinvar[VARIANT_KEY + CLINVAR_ANNOTATIONS].astype({"POS": "Int64"})
+    compared = old.merge(new, on=VARIANT_KEY, how="outer", suffixes=("_old", "_new"), indicator=True)
+
+    changed = compared["_merge"] != "both"
+    for column in CLINVAR_ANNOTATIONS:
+        old_values = compared[f"{column}_old"].astype(str)
+        new_values = compared[f"{column}_new"].astype(str)
+        changed |= old_values != new_values
+    return compared.loc[changed, VARIANT_KEY].drop_duplicates().reset_index(drop=True)
+
+
+def trait_fingerprints(gwas_df):
+    # Suma hashy wierszy jest niezależna od kolejności wierszy w katalogu
+    rows = gwas_df[GWAS_COLUMNS].astype(str)
+    hashes = pd.util.hash_pandas_object(rows, index=False)
+    return hashes.groupby(gwas_df["DISEASE/TRAIT"].astype(str).values).sum()
+
+
+def diff_gwas_traits(old_gwas, new_gwas):
+    """Zwraca zbiór cech (DISEASE/TRAIT), których wiersze w katalogu GWAS się zmieniły."""
+    old_fingerprints = trait_fingerprints(old_gwas)
+    new_fingerprints = trait_fingerprints(new_gwas)
+    compared = pd.concat([old_fingerprints.rename("old"), new_fingerprints.rename("new")], axis=1)
+    changed = compared["old"].isna() | compared["new"].isna() | (compared["old"] != compared["new"])
+    return set(compared.index[changed])
+
+
+def frames_equal(left, right, key):
+    if len(left) != len(right) or set(left.columns) != set(right.columns):
+        return False
+    if left.empty:
+        return True
+    left = left.astype(str).sort_values(key).reset_index(drop=True)
+    right = right[left.columns].astype(str).sort_values(key).reset_index(drop=True)
+    return left.equals(right)
+
+
+def reannotate_clinvar(patient_df, clinvar_matches, changed_keys, new_clinvar):
+    """Ponownie dopasowuje do ClinVar tylko warianty pacjenta, których dotyczy zmiana."""
+    patient_keys = patient_df.astype({"POS": "Int64"})
+    affected = patient_keys.merge(changed_keys, on=VARIANT_KEY, how="inner")
+    if affected.empty:
+        return clinvar_matches
+
+    reannotated = merge_clinvar_variants(affected, new_clinvar, output_dir=None)
+    stored = clinvar_matches.astype({"POS": "Int64"}).merge(changed_keys, on=VARIANT_KEY, how="left", indicator=True)
+    kept = stored[stored["_merge"] == "left_only"].drop(columns="_merge")
+    return pd.concat([kept, reannotated], ignore_index=True)
+
+
+def recompute_prs(patient_df, prs_scores, changed_traits, old_gwas, new_gwas, reference_blocks=None):
+    """
+    Przelicza PRS po zmianie katalogu GWAS. Jeśli żaden wariant pacjenta nie leży w pozycjach
+    zmienionych cech, wystarczy odświeżyć mean_prs (i MISSING_SITES dla gVCF), z-score
+    i kategorię ryzyka dla tych cech.
+    """
+    if not changed_traits:
+        return prs_scores
+
+    changed_rows = pd.concat([
+        old_gwas[old_gwas["DISEASE/TRAIT"].isin(changed_traits)],
+        new_gwas[new_gwas["DISEASE/TRAIT"].isin(changed_traits)],
+    ])
+    changed_positions = pd.DataFrame({
+        "CHROM": changed_rows["CHR_ID"].astype(str),
+        "POS": pd.to_numeric(changed_rows["CHR_POS"], errors="coerce").astype("Int64"),
+    }).drop_duplicates()
+    patient_positions = patient_df[["CHROM", "POS"]].astype({"CHROM": str, "POS": "Int64"})
+    if not patient_positions.merge(changed_positions, on=["CHROM", "POS"], how="inner").empty:
+        # Zmiana dotyka wariantów pacjenta - clumping może wybrać inne SNP, liczymy etap GWAS od nowa
+        return merge_gwas_variants(patient_df, new_gwas, output_dir=None, reference_blocks=reference_blocks)
+
+    changed_gwas = new_gwas[new_gwas["DISEASE/TRAIT"].isin(changed_traits)]
+    mean_prs, missing_sites = calculate_expected_prs(
+        patient_df.astype({"POS": "Int64"}), changed_gwas, prepare_gwas_table(changed_gwas), 5e-8, reference_blocks
+    )
+    unchanged = prs_scores[~prs_scores["DISEASE/TRAIT"].isin(changed_traits)]
+    updated = prs_scores[prs_scores["DISEASE/TRAIT"].isin(changed_traits)]
+    updated = updated.drop(columns=[column for column in ("mean_prs", "MISSING_SITES") if column in updated.columns])
+    updated = updated.merge(mean_prs, left_on="DISEASE/TRAIT", right_index=True, how="inner")
+    if missing_sites is not None:
+        updated = updated.merge(missing_sites, left_on="DISEASE/TRAIT", right_index=True, how="left")
+    updated = classify_risk(calculate_z_scores(updated))
+    return pd.concat([unchanged, updated], ignore_index=True).sort_values(by="PRS", ascending=False)
+
+
+def reanalyse_patients(store, old_clinvar, new_clinvar, old_gwas, new_gwas):
+    """
+    Ponowna adnotacja wszystkich zapisanych pacjentów po wydaniu nowej wersji ClinVar/GWAS.
+    Zwraca słownik {patient_id: {"clinvar_changed": bool, "prs_changed": bool}} tylko dla
+    pacjentów, których raport się zmienił.
+    """
+    changed_keys = diff_clinvar(old_clinvar, new_clinvar)
+    changed_traits = diff_gwas_traits(old_gwas, new_gwas)
+
+    changed_patients = {}
+    for patient_id in store.patient_ids():
+        patient_df = store.load_patient(patient_id)
+        reference_blocks = store.load_reference_blocks(patient_id)
+        clinvar_matches, prs_scores = store.load_results(patient_id)
+
+        new_matches = reannotate_clinvar(patient_df, clinvar_matches, changed_keys, new_clinvar)
+        new_prs = recompute_prs(patient_df, prs_scores, changed_traits, old_gwas, new_gwas, reference_blocks)
+
+        clinvar_changed = not frames_equal(clinvar_matches, new_matches, VARIANT_KEY)
+        prs_changed = not frames_equal(prs_scores, new_prs, ["DISEASE/TRAIT"])
+        if clinvar_changed or prs_changed:
+            store.save_results(patient_id, new_matches, new_prs)
+            changed_patients[patient_id] = {"clinvar_changed": clinvar_changed, "prs_changed": prs_changed}
+
+    return changed_patients
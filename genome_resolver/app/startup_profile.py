@@ -0,0 +1,97 @@
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+from .config import STARTUP_TARGET_SECONDS
+
+# Uruchamiane w świeżym interpreterze: import aplikacji, lifespan i pierwsze zapytanie /health
+FIRST_RESPONSE_SCRIPT = """
+from fastapi.testclient import TestClient
+from app.main import app
+
+with TestClient(app) as client:
+    response = client.get("/health")
+    print(response.status_code)
+"""
+
+
+def import_time_breakdown(module="app.main"):
+    """
+    Importuje moduł w osobnym procesie z `python -X importtime` i sumuje czas własny
+    modułów dla każdego pakietu najwyższego poziomu. Zwraca (łączny czas w ms, [(ms, pakiet)]).
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    packages = {}
+    for line in result.stderr.splitlines():
+        fields = line.split("|")
+        if len(fields) != 3 or not fields[1].strip().isdigit():
+            continue
+        self_us = int(fields[0].rsplit(":", 1)[1])
+        package = fields[2].strip().split(".")[0]
+        packages[package] = packages.get(package, 0) + self_us / 1000
+    breakdown = sorted(((ms, package) for package, ms in packages.items()), reverse=True)
+    return sum(packages.values()), breakdown
+
+
+def time_to_first_healthy_response(preload=None):
+    """
+    Mierzy czas od uruchomienia nowego procesu do pierwszej odpowiedzi 200 z /health.
+    preload=None - konfiguracja z bieżącego środowiska (domyślnie wczytywanie danych w tle);
+    True/False wymusza GENOME_RESOLVER_PRELOAD_REFERENCE.
+    """
+    env = dict(os.environ)
+    if preload is not None:
+        env["GENOME_RESOLVER_PRELOAD_REFERENCE"] = "1" if preload else "0"
+    started = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-c", FIRST_RESPONSE_SCRIPT],
+        capture_output=True,
+        text=True,
+        check=True,
+        env=env,
+    )
+    elapsed = time.perf_counter() - started
+    if result.stdout.strip().splitlines()[-1] != "200":
+        raise RuntimeError(f"/health did not return 200: {result.stdout.strip()}")
+    return elapsed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Profile API worker cold start (import time and first /health response).")
+    parser.add_argument("--top", type=int, default=15, help="Number of slowest packages to show.")
+    parser.add_argument("--runs", type=int, default=3, help="Number of cold starts to measure.")
+    parser.add_argument(
+        "--target",
+        type=float,
+        default=STARTUP_TARGET_SECONDS,
+        help="Time-to-first-healthy-response target in seconds (default: GENOME_RESOLVER_STARTUP_TARGET_SECONDS).",
+    )
+    args = parser.parse_args(argv)
+
+    total_ms, breakdown = import_time_breakdown()
+    print(f"Importing app.main takes {total_ms:.0f} ms; slowest packages:")
+    for ms, package in breakdown[:args.top]:
+        print(f"  {ms:8.1f} ms  {package}")
+
+    # Cel dotyczy konfiguracji z bieżącego środowiska (bez zmiennych - domyślnej, z preload
+    # i ANALYSIS_WORKERS); dla porównania także bez wczytywania danych referencyjnych
+    results = {}
+    for label, preload in (("configured", None), ("preload off", False)):
+        timings = [time_to_first_healthy_response(preload) for _ in range(args.runs)]
+        results[label] = min(timings)
+        print(
+            f"Time to first healthy response ({label}): best {min(timings):.2f}s, "
+            f"worst {max(timings):.2f}s over {args.runs} runs (target {args.target:.2f}s)."
+        )
+    return 0 if results["configured"] <= args.target else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -10,3 +10,21 @@ def truncate_text(text, max_length=30):
     if len(text) > max_length:
         return text[:max_length] + "..."
     return text
+
+def encode_genotypes(genotypes):
+    """Zamienia genotypy z cyvcf2 ([a1, a2, phased]) na listy liczb całkowitych (format Arrow)."""
+    if not isinstance(genotypes, (list, tuple)):
+        return None
+    return [[int(allele) for allele in call] for call in genotypes]
+
+def decode_genotypes(genotypes):
+    """Odwrotność encode_genotypes - przywraca flagę fazowania jako bool."""
+    if genotypes is None:
+        return None
+    decoded = []
+    for call in genotypes:
+        call = [int(allele) for allele in call]
+        if len(call) > 2:
+            call[-1] = bool(call[-1])
+        decoded.append(call)
+    return decoded
@@ -0,0 +1,42 @@
+import gc
+from app.batch import (
+    sample_id_from_path,
+    find_vcf_files,
+    load_checkpoint,
+    mark_completed,
+    run_batch
+)
+
+# Test dla sample_id_from_path
+def test_sample_id_from_path():
+    assert sample_id_from_path("/data/cohort/P001.vcf.gz") == "P001"
+    assert sample_id_from_path("P002.vcf") == "P002"
+
+# Test dla find_vcf_files
+def test_find_vcf_files(tmp_path):
+    (tmp_path / "b.vcf.gz").write_bytes(b"")
+    (tmp_path / "a.vcf").write_text("")
+    (tmp_path / "notes.txt").write_text("")
+
+    found = find_vcf_files(str(tmp_path))
+    assert [sample_id_from_path(path) for path in found] == ["a", "b"]
+
+# Test dla checkpointu (wznawianie przetwarzania)
+def test_checkpoint_roundtrip(tmp_path):
+    assert load_checkpoint(str(tmp_path)) == set()
+
+    mark_completed(str(tmp_path), "P001")
+    mark_completed(str(tmp_path), "P002")
+    assert load_checkpoint(str(tmp_path)) == {"P001", "P002"}
+
+# Test dla run_batch - bez próbek do przetworzenia GC nie zostaje zamrożony
+def test_run_batch_nothing_pending(tmp_path):
+    input_dir = tmp_path / "input"
+    input_dir.mkdir()
+    (input_dir / "P001.vcf").write_text("")
+    output_dir = tmp_path / "output"
+    output_dir.mkdir()
+    mark_completed(str(output_dir), "P001")
+
+    assert run_batch(str(input_dir), str(output_dir)) == (0, [])
+    assert gc.get_freeze_count() == 0
@@ -0,0 +1,17 @@
+import pandas as pd
+from app.database import data_store
+
+# Test dla leniwego wczytywania danych referencyjnych - każdy plik jest wczytywany raz
+def test_reference_data_loaded_once(mocker):
+    mocker.patch.dict(data_store._reference_data, clear=True)
+    load_clinvar = mocker.patch("app.database.load_db.load_clinvar_vcf", return_value=pd.DataFrame({"CHROM": ["1"]}))
+    load_gwas = mocker.patch("app.database.load_db.load_gwas_to_db", return_value=pd.DataFrame({"CHR_ID": ["1"]}))
+
+    assert not data_store.reference_data_loaded()
+    data_store.load_reference_data()
+    data_store.get_clinvar_df()
+    assert data_store.gwas_df is data_store.get_gwas_df()
+
+    assert data_store.reference_data_loaded()
+    load_clinvar.assert_called_once_with(data_store.CLINVAR_PATH)
+    load_gwas.assert_called_once_with(data_store.GWAS_PATH)
@@ -0,0 +1,72 @@
+import os
+import pytest
+import pandas as pd
+from app.database import load_db
+from app.database.load_db import (
+    load_gwas_to_db,
+    parse_gwas_catalog,
+    split_multi_positions,
+    gwas_cache_path
+)
+
+GWAS_HEADER = ["DATE ADDED TO CATALOG", "PUBMEDID", "CHR_ID", "CHR_POS", "SNP_ID_CURRENT",
+               "DISEASE/TRAIT", "P-VALUE", "OR or BETA", "MAPPED_GENE", "STUDY"]
+
+# Mock katalogu GWAS (z dodatkowymi kolumnami, które nie powinny być wczytane)
+@pytest.fixture
+def mock_gwas_file(tmp_path):
+    rows = [
+        ["2020-01-01", "1", "1", "12345", "111", "Trait1", "2E-9", "1.5", "Gene1", "Study1"],
+        ["2020-01-01", "2", "1;2", "100;200", "222", "Trait2", "1E-10", "0.8", "Gene2", "Study2"],
+        ["2020-01-01", "3", "3", "300 x 400", "333", "Trait1", "3E-8", "", "Gene3", "Study3"],
+        ["2020-01-01", "4", "", "", "444", "Trait3", "1E-5", "NR", "", "Study4"],
+    ]
+    gwas_file = tmp_path / "gwas_catalog.tsv"
+    gwas_file.write_text("\n".join("\t".join(row) for row in [GWAS_HEADER] + rows) + "\n")
+    return str(gwas_file)
+
+# Test dla split_multi_positions
+def test_split_multi_positions():
+    df = pd.DataFrame({"CHR_ID": ["1;2", "3", "X"], "CHR_POS": ["100;200", "300 x 400", "500"]})
+    split = split_multi_positions(df)
+    assert split["CHR_ID"].tolist() == ["1", "2", "3", "3", "X"]
+    assert split["CHR_POS"].tolist() == ["100", "200", "300", "400", "500"]
+    assert split["ASSOCIATION_ID"].tolist() == [0, 0, 1, 1, 2]
+
+# Test dla parse_gwas_catalog - projekcja kolumn i jawne typy
+def test_parse_gwas_catalog(mock_gwas_file):
+    df = parse_gwas_catalog(mock_gwas_file)
+    assert df.columns.tolist() == load_db.GWAS_TABLE_COLUMNS
+    assert len(df) == 6
+    assert df["CHR_POS"].dtype == "Int64"
+    assert df["P-VALUE"].dtype == "float64"
+    assert df["OR or BETA"].dtype == "float64"
+    assert df["DISEASE/TRAIT"].dtype == "category"
+    assert df["CHR_POS"].dropna().tolist() == [12345, 100, 200, 300, 400]
+    assert df["OR or BETA"].isna().sum() == 3
+
+# Test dla load_gwas_to_db - drugi odczyt korzysta z pliku Arrow zamiast TSV
+def test_load_gwas_to_db_uses_cache(mocker, mock_gwas_file):
+    pytest.importorskip("pyarrow")
+
+    first = load_gwas_to_db(mock_gwas_file)
+    assert os.path.exists(gwas_cache_path(mock_gwas_file))
+
+    parse = mocker.patch("app.database.load_db.parse_gwas_catalog")
+    second = load_gwas_to_db(mock_gwas_file)
+    parse.assert_not_called()
+    pd.testing.assert_frame_equal(first, second)
+
+# Test dla load_gwas_to_db - uszkodzony plik cache jest traktowany jak jego brak
+def test_load_gwas_to_db_corrupt_cache(mock_gwas_file):
+    pytest.importorskip("pyarrow")
+
+    cache_path = gwas_cache_path(mock_gwas_file)
+    with open(cache_path, "wb") as cache:
+        cache.write(b"ARROW1\x00\x00truncated")
+
+    df = load_gwas_to_db(mock_gwas_file)
+    pd.testing.assert_frame_equal(df, parse_gwas_catalog(mock_gwas_file))
+    # Cache został zapisany ponownie (atomowo, bez pozostawionych plików tymczasowych)
+    pd.testing.assert_frame_equal(load_gwas_to_db(mock_gwas_file), df)
+    assert sorted(os.listdir(os.path.dirname(cache_path))) == ["gwas_catalog.arrow", "gwas_catalog.tsv"]
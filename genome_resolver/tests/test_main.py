@@ -1,3 +1,7 @@
+import os
+import subprocess
+import sys
+import threading
 from fastapi.testclient import TestClient
 from app.main import app
 
@@ -14,3 +18,61 @@ def test_read_root():
 def test_text_generation_router():
     response = client.get("/text")  # Example GET request to /text
     assert response.status_code in [200, 404]  # Adjust based on actual endpoint behavior
+
+# Test dla /health - odpowiada od razu, niezależnie od danych referencyjnych
+def test_health():
+    response = client.get("/health")
+    assert response.status_code == 200
+    assert response.json() == {"status": "ok"}
+
+# Test dla /health w trakcie lifespan - odpowiada, zanim dane referencyjne zostaną wczytane
+def test_health_does_not_wait_for_reference_data(mocker):
+    release = threading.Event()
+    loading = threading.Event()
+
+    def slow_load():
+        loading.set()
+        release.wait(timeout=10)
+
+    mocker.patch("app.main.data_store.load_reference_data", side_effect=slow_load)
+    mocker.patch("app.main.PRELOAD_REFERENCE_DATA", True)
+    mocker.patch("app.main.SHARDING_ENABLED", False)
+    try:
+        with TestClient(app) as lifespan_client:
+            assert loading.wait(timeout=5)
+            assert lifespan_client.get("/health").status_code == 200
+    finally:
+        release.set()
+
+# Test dla /ready - 503 dopóki ClinVar i GWAS nie są wczytane
+def test_ready(mocker):
+    loaded = mocker.patch("app.database.data_store.reference_data_loaded", return_value=False)
+    assert client.get("/ready").status_code == 503
+
+    loaded.return_value = True
+    response = client.get("/ready")
+    assert response.status_code == 200
+    assert response.json() == {"status": "ready"}
+
+# Test dla /ready - przy włączonym podziale na chromosomy wymaga działającej puli procesów
+def test_ready_requires_shard_pool(mocker):
+    mocker.patch("app.database.data_store.reference_data_loaded", return_value=True)
+    mocker.patch("app.main.SHARDING_ENABLED", True)
+    pool_ready = mocker.patch("app.main.shard_pool_ready", return_value=False)
+    response = client.get("/ready")
+    assert response.status_code == 503
+    assert response.json() == {"status": "shard pool unavailable"}
+
+    pool_ready.return_value = True
+    assert client.get("/ready").status_code == 200
+
+# Test dla zimnego startu - import aplikacji nie wczytuje danych ani ciężkich bibliotek
+def test_import_is_lazy():
+    script = (
+        "import sys, app.main\n"
+        "from app.database import data_store\n"
+        "print(data_store.reference_data_loaded(), *(module in sys.modules for module in ('reportlab', 'ollama', 'cyvcf2')))"
+    )
+    repo_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    result = subprocess.run([sys.executable, "-c", script], capture_output=True, text=True, check=True, cwd=repo_root)
+    assert result.stdout.split() == ["False", "False", "False", "False"]
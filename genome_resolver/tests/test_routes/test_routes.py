@@ -1,7 +1,13 @@
+import os
+from concurrent.futures import Future
 import pytest
+import pandas as pd
 from fastapi.testclient import TestClient
 from unittest.mock import patch
 from app.main import app
+from app.routes.routes import admission
+from app.services.reference_blocks import ReferenceBlockIndex
+from app.services.render_service import RenderQueueFull
 
 client = TestClient(app)
 
@@ -102,3 +108,101 @@ def test_generate_health_report_valid_files(mocker, tmp_path):
         )
     assert response.status_code == 200
     assert response.headers["content-type"] == "application/pdf"
+
+# Test dla /text/generate-report - każde zapytanie ma własny katalog raportu, usuwany po wysłaniu pliku
+def test_generate_report_uses_request_directory(mocker, tmp_path):
+    output_dirs = []
+
+    def fake_analysis(combined_df, output_dir, reference_blocks=None):
+        output_dirs.append(output_dir)
+        report_path = os.path.join(output_dir, "medical_report.pdf")
+        with open(report_path, "wb") as report:
+            report.write(b"%PDF-" + str(len(output_dirs)).encode())
+        return report_path
+
+    mocker.patch("app.routes.routes.perform_full_analysis", side_effect=fake_analysis)
+    vcf = (
+        "##fileformat=VCFv4.2\n##contig=<ID=1>\n#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\n"
+        "1\t12345\t.\tA\tG\t60\tPASS\t.\n"
+    ).encode()
+
+    responses = [
+        client.post("/text/generate-report", files={"files": ("test.vcf", vcf, "application/octet-stream")})
+        for _ in range(2)
+    ]
+    assert [response.content for response in responses] == [b"%PDF-1", b"%PDF-2"]
+    assert output_dirs[0] != output_dirs[1]
+    assert not any(os.path.exists(output_dir) for output_dir in output_dirs)
+
+# Test dla /text/merge-gwas-variants - wynik nie jest zapisywany do pliku CSV w żadnym trybie
+@pytest.mark.parametrize("response_format", ["json", "ndjson"])
+def test_merge_gwas_variants_skips_csv(mocker, response_format):
+    prs_scores = pd.DataFrame({"DISEASE/TRAIT": ["Trait1"], "PRS": [1.5], "Risk_Category": ["Normal Risk"]})
+    mocker.patch("app.routes.routes.read_variant_upload", return_value=(pd.DataFrame(), ReferenceBlockIndex()))
+    mocker.patch("app.routes.routes.get_gwas_df")
+    merge = mocker.patch("app.routes.routes.merge_gwas_variants", return_value=prs_scores)
+
+    response = client.post(
+        f"/text/merge-gwas-variants?format={response_format}",
+        files={"file": ("test.vcf", b"", "application/octet-stream")}
+    )
+    assert response.status_code == 200
+    assert merge.call_args.kwargs["output_dir"] is None
+
+# Test dla /text/merge-clinvar-variants - odpowiedź strumieniowa zajmuje budżet do wysłania ostatniego fragmentu
+def test_streaming_response_holds_admission(mocker):
+    matched_variants = pd.DataFrame({"CHROM": ["1"], "POS": [12345], "CLNSIG": ["Pathogenic"]})
+    mocker.patch("app.routes.routes.read_variant_upload", return_value=(pd.DataFrame(), ReferenceBlockIndex()))
+    mocker.patch("app.routes.routes.get_clinvar_df")
+    mocker.patch("app.routes.routes.merge_clinvar_variants", return_value=matched_variants)
+    active_while_streaming = []
+
+    def fake_batches(df):
+        active_while_streaming.append(admission.metrics()["active_requests"])
+        yield b'{"CHROM":"1"}\n'
+
+    mocker.patch("app.routes.routes.iter_ndjson_batches", side_effect=fake_batches)
+    response = client.post(
+        "/text/merge-clinvar-variants?format=ndjson",
+        files={"file": ("test.vcf", b"", "application/octet-stream")}
+    )
+    assert response.status_code == 200
+    assert active_while_streaming == [1]
+    assert admission.metrics()["active_requests"] == 0
+
+# Test dla /text/generate-report - raport renderuje pula procesów renderujących
+def test_generate_report_uses_render_service(mocker):
+    matched_variants = pd.DataFrame({"CHROM": ["1"], "POS": [12345]})
+    prs_scores = pd.DataFrame({"DISEASE/TRAIT": ["Trait1"], "PRS": [1.5]})
+    mocker.patch("app.routes.routes.read_variant_upload", return_value=(pd.DataFrame({"POS": [12345]}), ReferenceBlockIndex()))
+    mocker.patch("app.routes.routes.analyse_variants", return_value=(matched_variants, prs_scores))
+    inline = mocker.patch("app.routes.routes.perform_full_analysis")
+
+    def fake_submit(payload, output_file, timeout=None):
+        assert pd.DataFrame(**payload["prs"]).equals(prs_scores)
+        with open(output_file, "wb") as report:
+            report.write(b"%PDF-rendered")
+        future = Future()
+        future.set_result(output_file)
+        return future
+
+    service = mocker.Mock()
+    service.submit.side_effect = fake_submit
+    mocker.patch("app.routes.routes.get_render_service", return_value=service)
+
+    response = client.post("/text/generate-report", files={"files": ("test.vcf", b"", "application/octet-stream")})
+    assert response.status_code == 200
+    assert response.content == b"%PDF-rendered"
+    inline.assert_not_called()
+
+# Test dla /text/generate-report - pełna kolejka renderowania zwraca 503 z Retry-After
+def test_generate_report_render_queue_full(mocker):
+    mocker.patch("app.routes.routes.read_variant_upload", return_value=(pd.DataFrame({"POS": [12345]}), ReferenceBlockIndex()))
+    mocker.patch("app.routes.routes.analyse_variants", return_value=(pd.DataFrame(), pd.DataFrame()))
+    service = mocker.Mock()
+    service.submit.side_effect = RenderQueueFull("Render queue is full (2 pending reports).")
+    mocker.patch("app.routes.routes.get_render_service", return_value=service)
+
+    response = client.post("/text/generate-report", files={"files": ("test.vcf", b"", "application/octet-stream")})
+    assert response.status_code == 503
+    assert int(response.headers["Retry-After"]) >= 1
@@ -0,0 +1,103 @@
+import gzip
+import io
+import threading
+import time
+import pytest
+from fastapi import UploadFile
+from app.services.admission import (
+    AdmissionController,
+    AdmissionRejected,
+    RequestCost,
+    estimate_upload_cost,
+    sample_vcf_record_count
+)
+
+VCF_HEADER = "##fileformat=VCFv4.2\n#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\n"
+
+def make_vcf(records):
+    lines = [f"1\t{i + 1}\t.\tA\tG\t60\tPASS\t.\n" for i in range(records)]
+    return (VCF_HEADER + "".join(lines)).encode()
+
+def make_cost(memory_bytes):
+    return RequestCost(records=0, memory_bytes=memory_bytes, cpu_seconds=1.0)
+
+# Test dla sample_vcf_record_count - cały plik w próbce daje dokładny wynik
+def test_sample_vcf_record_count_exact():
+    data = make_vcf(100)
+    assert sample_vcf_record_count(io.BytesIO(data), len(data)) == 100
+
+# Test dla sample_vcf_record_count - ekstrapolacja z początku pliku (także BGZF, wiele członów gzip)
+@pytest.mark.parametrize("compression", [None, "gzip", "bgzf"])
+def test_sample_vcf_record_count_extrapolated(compression):
+    data = make_vcf(50000)
+    if compression == "gzip":
+        data = gzip.compress(data)
+    elif compression == "bgzf":
+        data = b"".join(gzip.compress(data[start:start + 65280]) for start in range(0, len(data), 65280))
+
+    stream = io.BytesIO(data)
+    estimate = sample_vcf_record_count(stream, len(data), sample_bytes=len(data) // 4)
+    assert abs(estimate - 50000) < 50000 * 0.1
+    assert stream.tell() == 0
+
+# Test dla estimate_upload_cost - suma kosztów kilku plików
+def test_estimate_upload_cost():
+    files = [UploadFile(io.BytesIO(make_vcf(10)), filename=name) for name in ("a.vcf", "b.vcf")]
+    cost = estimate_upload_cost(files)
+    single = estimate_upload_cost(files[:1])
+
+    assert cost.records == 20
+    assert cost.memory_bytes > single.memory_bytes
+    assert files[0].file.tell() == 0
+
+# Test dla odrzucenia zapytania większego niż cały budżet
+def test_admit_too_large():
+    controller = AdmissionController(memory_budget=100)
+    with pytest.raises(AdmissionRejected) as rejected:
+        with controller.admit(make_cost(101)):
+            pass
+    assert rejected.value.status_code == 413
+    assert controller.metrics()["rejected"] == {"too_large": 1}
+
+# Test dla kolejki - drugie zapytanie czeka na zwolnienie budżetu, trzecie jest odrzucane
+def test_admit_queues_and_rejects():
+    controller = AdmissionController(memory_budget=100, max_queue=1, queue_timeout=5)
+    admitted = threading.Event()
+
+    def queued_request():
+        with controller.admit(make_cost(60)):
+            admitted.set()
+
+    with controller.admit(make_cost(60)):
+        waiting = threading.Thread(target=queued_request)
+        waiting.start()
+        deadline = time.monotonic() + 5
+        while controller.metrics()["queue_depth"] == 0:
+            assert time.monotonic() < deadline, "request was not queued"
+            time.sleep(0.01)
+
+        with pytest.raises(AdmissionRejected) as rejected:
+            with controller.admit(make_cost(10)):
+                pass
+        assert rejected.value.status_code == 503
+        assert rejected.value.retry_after >= 1
+        assert not admitted.is_set()
+
+    waiting.join(timeout=5)
+    assert admitted.is_set()
+    metrics = controller.metrics()
+    assert metrics["admitted_total"] == 2
+    assert metrics["rejected"] == {"queue_full": 1}
+    assert metrics["memory_in_use_bytes"] == 0
+    assert metrics["queue_depth"] == 0
+
+# Test dla limitu czasu oczekiwania w kolejce
+def test_admit_queue_timeout():
+    controller = AdmissionController(memory_budget=100, queue_timeout=0.05)
+    with controller.admit(make_cost(80)):
+        with pytest.raises(AdmissionRejected) as rejected:
+            with controller.admit(make_cost(80)):
+                pass
+    assert rejected.value.status_code == 503
+    assert controller.metrics()["rejected"] == {"timeout": 1}
+    assert controller.metrics()["queue_depth"] == 0
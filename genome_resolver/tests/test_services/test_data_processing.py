@@ -1,3 +1,5 @@
+import os
+import signal
 import pytest
 import pandas as pd
 from app.services.data_processing import (
@@ -7,8 +9,16 @@ from app.services.data_processing import (
     calculate_allele_count,
     calculate_prs_for_trait,
     classify_risk,
-    calculate_z_scores
+    calculate_z_scores,
+    score_site_dosages,
+    score_gwas_matches,
+    prepare_gwas_table,
+    process_variant_file,
+    process_columnar_file
 )
+from app.services.reference_blocks import ReferenceBlockIndex
+from app.services import data_processing
+from app.database.load_db import split_multi_positions
 
 # Mock danych ClinVar i GWAS
 @pytest.fixture
@@ -52,7 +62,7 @@ def test_process_vcf_file(mocker, tmp_path):
         "1\t54321\t.\tT\tC\t55\tPASS\t.\n"
     )
 
-    mock_vcf_reader = mocker.patch("app.services.data_processing.VCF")
+    mock_vcf_reader = mocker.patch("cyvcf2.VCF")
     mock_vcf_reader.return_value = iter([
         mocker.Mock(CHROM="1", POS=12345, REF="A", ALT=["G"], QUAL=60, genotypes=[[1, 0]]),
         mocker.Mock(CHROM="1", POS=54321, REF="T", ALT=["C"], QUAL=55, genotypes=[[0, 1]])
@@ -110,3 +120,225 @@ def test_calculate_z_scores():
     z_scores = calculate_z_scores(mock_prs_scores)
     assert "z_score" in z_scores.columns
     assert z_scores["z_score"].tolist() == [5.0, 2.5]
+
+# Test dla score_site_dosages - hom-ref z bloków gVCF vs brak wywołania
+def test_score_site_dosages(mock_vcf_df):
+    sites = pd.DataFrame({
+        "CHROM": ["1", "1", "1"],
+        "POS": pd.array([12345, 20000, 90000], dtype="Int64")
+    })
+    patient_df = mock_vcf_df.astype({"POS": "Int64"})
+    reference_blocks = ReferenceBlockIndex.from_records(["1"], [15000], [25000], [40])
+
+    dosages = score_site_dosages(sites, patient_df, reference_blocks)
+    assert dosages.tolist()[:2] == [2.0, 0.0]
+    assert pd.isna(dosages.tolist()[2])
+
+# Test dla score_gwas_matches - kategoryczne DISEASE/TRAIT zwraca tylko cechy z dopasowaniami
+def test_score_gwas_matches_categorical_traits(mock_vcf_df):
+    gwas_df = pd.DataFrame({
+        "CHR_ID": ["1", "1"],
+        "CHR_POS": pd.array([12345, 90000], dtype="Int64"),
+        "SNP_ID_CURRENT": ["1", "2"],
+        "DISEASE/TRAIT": pd.Categorical(["Trait1", "Trait2"]),
+        "P-VALUE": [1e-9, 1e-9],
+        "OR or BETA": [1.5, 0.5],
+        "MAPPED_GENE": pd.Categorical(["Gene1", "Gene2"])
+    })
+    ld_blocks = pd.DataFrame({
+        "chromosome": ["1"],
+        "start": pd.array([1], dtype="Int64"),
+        "end": pd.array([100000], dtype="Int64")
+    })
+
+    trait_prs = score_gwas_matches(mock_vcf_df.astype({"POS": "Int64"}), prepare_gwas_table(gwas_df), ld_blocks)
+    assert trait_prs.index.tolist() == ["Trait1"]
+    assert trait_prs.notna().all()
+
+# Test dla merge_gwas_variants - asocjacja rozdzielona na kilka pozycji liczy się w PRS raz
+def test_merge_gwas_variants_split_association(mocker):
+    gwas_df = split_multi_positions(pd.DataFrame({
+        "CHR_ID": ["1;1"],
+        "CHR_POS": ["100;200"],
+        "SNP_ID_CURRENT": ["1"],
+        "DISEASE/TRAIT": ["Trait1"],
+        "P-VALUE": [1e-9],
+        "OR or BETA": [1.5],
+        "MAPPED_GENE": ["Gene1"]
+    })).astype({"CHR_POS": "Int64"})
+    patient_df = pd.DataFrame({
+        "CHROM": ["1", "1"],
+        "POS": [100, 200],
+        "REF": ["A", "T"],
+        "ALT": ["G", "C"],
+        "QUAL": [60, 60],
+        "GENOTYPES": [[[1, 1, False]], [[0, 1, False]]]
+    })
+    # Pozycje haplotypu w różnych blokach LD
+    mocker.patch("app.services.data_processing.load_ld_blocks", return_value=pd.DataFrame({
+        "chromosome": ["1", "1"],
+        "start": pd.array([1, 150], dtype="Int64"),
+        "end": pd.array([149, 1000], dtype="Int64")
+    }))
+
+    merged = merge_gwas_variants(patient_df, gwas_df, output_dir=None)
+    assert merged["mean_prs"].tolist() == [1.5]
+    assert merged["PRS"].tolist() == [3.0]
+
+# Test dla merge_gwas_variants z blokami referencyjnymi gVCF
+def test_merge_gwas_variants_with_reference_blocks(mocker, mock_vcf_df):
+    gwas_df = pd.DataFrame({
+        "CHR_ID": ["1", "1", "1"],
+        "CHR_POS": [12345, 20000, 90000],
+        "SNP_ID_CURRENT": ["1", "2", "3"],
+        "DISEASE/TRAIT": ["Trait1", "Trait1", "Trait1"],
+        "P-VALUE": [1e-9, 1e-9, 1e-9],
+        "OR or BETA": [1.5, 0.5, 0.7],
+        "MAPPED_GENE": ["Gene1", "Gene3", "Gene4"]
+    })
+    reference_blocks = ReferenceBlockIndex.from_records(["1"], [15000], [25000], [40])
+    mocker.patch("app.services.data_processing.load_ld_blocks", return_value=pd.DataFrame({
+        "chromosome": ["1"],
+        "start": pd.array([1], dtype="Int64"),
+        "end": pd.array([100000], dtype="Int64")
+    }))
+
+    merged = merge_gwas_variants(mock_vcf_df, gwas_df, output_dir=None, reference_blocks=reference_blocks)
+    trait1 = merged[merged["DISEASE/TRAIT"] == "Trait1"].iloc[0]
+    # Pozycja 90000 nie ma wywołania - nie wchodzi do mean_prs
+    assert trait1["mean_prs"] == 2.0
+    assert trait1["MISSING_SITES"] == 1
+
+# Test dla analyse_variants_sharded - wynik taki sam jak w analizie sekwencyjnej
+def test_analyse_variants_sharded_matches_sequential(mocker, mock_clinvar_df):
+
+    patient_df = pd.DataFrame({
+        "CHROM": ["1", "1", "2", "2", "3"],
+        "POS": [12345, 54321, 100, 200, 300],
+        "REF": ["A", "T", "G", "C", "A"],
+        "ALT": ["G", "C", "A", "T", "G"],
+        "QUAL": [60, 55, 70, 80, 90],
+        "GENOTYPES": [[[1, 1, False]], [[0, 1, False]], [[0, 1, False]], [[1, 1, False]], [[0, 1, False]]]
+    })
+    gwas_df = pd.DataFrame({
+        "CHR_ID": ["1", "1", "2", "2", "X"],
+        "CHR_POS": [12345, 54321, 100, 200, 500],
+        "SNP_ID_CURRENT": ["1", "2", "3", "4", "5"],
+        "DISEASE/TRAIT": ["Trait1", "Trait2", "Trait1", "Trait2", "Trait3"],
+        "P-VALUE": [1e-9, 1e-10, 1e-12, 1e-9, 1e-9],
+        "OR or BETA": [1.5, 2.0, 0.5, 0.7, 1.0],
+        "MAPPED_GENE": ["Gene1", "Gene2", "Gene3", "Gene4", "Gene5"]
+    })
+    ld_blocks = pd.DataFrame({
+        "chromosome": ["1", "1", "2"],
+        "start": pd.array([1, 20000, 1], dtype="Int64"),
+        "end": pd.array([19999, 99999, 1000], dtype="Int64")
+    })
+    mocker.patch.multiple(
+        data_processing,
+        get_clinvar_df=mocker.Mock(return_value=mock_clinvar_df),
+        get_gwas_df=mocker.Mock(return_value=gwas_df),
+        _shard_pool=None,
+        _shard_chromosomes=frozenset(),
+        _shard_gwas_table=None
+    )
+    mocker.patch("app.services.data_processing.load_ld_blocks", return_value=ld_blocks)
+
+    sequential_clinvar, sequential_prs = data_processing.analyse_variants(patient_df.copy(), output_dir=None, workers=1)
+    pool = data_processing.get_shard_pool(2)
+    try:
+        sharded_clinvar, sharded_prs = data_processing.analyse_variants_sharded(patient_df.copy(), output_dir=None)
+    finally:
+        pool.shutdown()
+
+    assert sharded_clinvar["POS"].tolist() == sequential_clinvar["POS"].tolist()
+    pd.testing.assert_frame_equal(
+        sharded_prs.sort_values("DISEASE/TRAIT").reset_index(drop=True),
+        sequential_prs.sort_values("DISEASE/TRAIT").reset_index(drop=True)
+    )
+
+# Test dla analyse_variants_sharded - po śmierci procesu roboczego analiza działa w jednym procesie,
+# a pula nie jest tworzona ponownie z wątku zapytania
+def test_analyse_variants_sharded_broken_pool_falls_back(mocker, mock_clinvar_df, mock_vcf_df):
+    mocker.patch.multiple(
+        data_processing,
+        get_clinvar_df=mocker.Mock(return_value=mock_clinvar_df),
+        get_gwas_df=mocker.Mock(return_value=pd.DataFrame({
+            "CHR_ID": ["1"],
+            "CHR_POS": [12345],
+            "SNP_ID_CURRENT": ["1"],
+            "DISEASE/TRAIT": ["Trait1"],
+            "P-VALUE": [1e-9],
+            "OR or BETA": [1.5],
+            "MAPPED_GENE": ["Gene1"]
+        })),
+        _shard_pool=None,
+        _shard_chromosomes=frozenset(),
+        _shard_gwas_table=None
+    )
+    mocker.patch("app.services.data_processing.load_ld_blocks", return_value=pd.DataFrame({
+        "chromosome": ["1"],
+        "start": pd.array([1], dtype="Int64"),
+        "end": pd.array([100000], dtype="Int64")
+    }))
+
+    broken_pool = data_processing.get_shard_pool(2)
+    for process in list(broken_pool._processes.values()):
+        os.kill(process.pid, signal.SIGKILL)
+        process.join()
+    try:
+        matched, prs_scores = data_processing.analyse_variants_sharded(mock_vcf_df.copy(), output_dir=None)
+        assert not data_processing.shard_pool_ready()
+    finally:
+        data_processing.reset_shard_pool()
+
+    assert matched["POS"].tolist() == [12345, 54321]
+    assert prs_scores["DISEASE/TRAIT"].tolist() == ["Trait1"]
+
+# Test dla analyse_variants - bez uruchomionej puli duże pliki są analizowane w jednym procesie
+def test_analyse_variants_without_shard_pool(mocker):
+    mocker.patch("app.services.data_processing._shard_pool", None)
+    mocker.patch("app.services.data_processing.SHARDING_MIN_VARIANTS", 0)
+    sharded = mocker.patch("app.services.data_processing.analyse_variants_sharded")
+    mocker.patch("app.services.data_processing.merge_clinvar_variants", return_value="clinvar")
+    mocker.patch("app.services.data_processing.merge_gwas_variants", return_value="prs")
+    mocker.patch.multiple(data_processing, get_clinvar_df=mocker.Mock(), get_gwas_df=mocker.Mock())
+
+    assert data_processing.analyse_variants(pd.DataFrame(), output_dir=None, workers=2) == ("clinvar", "prs")
+    sharded.assert_not_called()
+
+@pytest.mark.parametrize("file_name", ["variants.parquet", "variants.arrow"])
+def test_process_columnar_file(tmp_path, file_name):
+    pa = pytest.importorskip("pyarrow")
+    import pyarrow.parquet as pq
+
+    table = pa.table({
+        "CHROM": ["1", "1", "2"],
+        "POS": pa.array([12345, 54321, 100], type=pa.int64()),
+        "REF": ["A", "T", "G"],
+        "ALT": [["G"], ["C", "<NON_REF>"], ["A"]],
+        "QUAL": [60.0, 55.0, 10.0],
+        "GENOTYPES": pa.array([[[0, 1, 0]], [[1, 1, 1]], [[0, 1, 0]]], type=pa.list_(pa.list_(pa.int8())))
+    })
+    path = tmp_path / file_name
+    if file_name.endswith(".parquet"):
+        pq.write_table(table, path)
+    else:
+        with pa.ipc.new_file(str(path), table.schema) as writer:
+            writer.write_table(table)
+
+    result, reference_blocks = process_variant_file(path)
+    assert result["POS"].tolist() == [12345, 54321]
+    assert result["ALT"].tolist() == ["G", "C"]
+    assert result["GENOTYPES"].tolist() == [[[0, 1, False]], [[1, 1, True]]]
+    assert len(reference_blocks) == 0
+
+# Test dla walidacji schematu tabeli wariantów
+def test_process_columnar_file_invalid_schema(tmp_path):
+    pa = pytest.importorskip("pyarrow")
+    import pyarrow.parquet as pq
+
+    path = tmp_path / "variants.parquet"
+    pq.write_table(pa.table({"CHROM": ["1"], "POS": ["12345"]}), path)
+    with pytest.raises(ValueError):
+        process_columnar_file(path)
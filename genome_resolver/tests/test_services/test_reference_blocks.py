@@ -0,0 +1,42 @@
+from app.services.reference_blocks import ReferenceBlockIndex
+
+# Test dla budowy indeksu bloków referencyjnych
+def test_from_records():
+    index = ReferenceBlockIndex.from_records(
+        ["1", "1", "2"], [500, 100, 10], [600, 199, 20], [30, 40, 50]
+    )
+    assert len(index) == 3
+    starts, ends, min_gqs = index.blocks["1"]
+    assert starts.tolist() == [100, 500]
+    assert ends.tolist() == [199, 600]
+
+# Test dla lookup - wektorowe wyszukiwanie pozycji w blokach
+def test_lookup():
+    index = ReferenceBlockIndex.from_records(
+        ["1", "1", "2"], [100, 300, 10], [199, 400, 20], [30, 5, 50]
+    )
+    covered = index.lookup(
+        ["1", "1", "1", "1", "2", "3", "1"],
+        [100, 199, 250, 350, 15, 15, None]
+    )
+    # pozycja 350 leży w bloku o zbyt niskim GQ
+    assert covered.tolist() == [True, True, False, False, True, False, False]
+    assert index.lookup(["1"], [350], min_gq=0).tolist() == [True]
+
+# Test dla concat - nakładające się bloki z kilku plików
+def test_concat_overlapping_blocks():
+    first = ReferenceBlockIndex.from_records(["1"], [100], [1000], [30])
+    second = ReferenceBlockIndex.from_records(["1", "X"], [200, 5], [300, 50], [30, 30])
+    combined = ReferenceBlockIndex.concat([first, second, ReferenceBlockIndex()])
+
+    assert len(combined) == 3
+    assert combined.lookup(["1", "1", "X"], [500, 1001, 6]).tolist() == [True, False, True]
+
+# Test dla to_frame/from_frame - zapis i odczyt bloków jako tabeli
+def test_frame_roundtrip():
+    index = ReferenceBlockIndex.from_records(["1", "1", "X"], [100, 300, 5], [199, 400, 50], [30, 5, 50])
+    restored = ReferenceBlockIndex.from_frame(index.to_frame())
+
+    assert len(restored) == 3
+    assert restored.lookup(["1", "1", "X"], [150, 350, 6]).tolist() == [True, False, True]
+    assert len(ReferenceBlockIndex.from_frame(ReferenceBlockIndex().to_frame())) == 0
@@ -0,0 +1,63 @@
+import pytest
+import pandas as pd
+from app.services.render_service import (
+    ReportRenderService,
+    RenderQueueFull,
+    serialize_report_inputs,
+    render_report
+)
+
+# Mock danych ClinVar i GWAS
+@pytest.fixture
+def mock_clinvar_df():
+    return pd.DataFrame({
+        "CHROM": ["1", "2"],
+        "POS": [12345, 54321],
+        "REF": ["A", "T"],
+        "ALT": ["G", "C"],
+        "GENEINFO": ["GENE1", "GENE2"],
+        "DISEASE": ["Disease1", "Disease2"],
+        "CLNSIG": ["Pathogenic", "Likely Pathogenic"],
+        "GENOTYPES": [[[1, 1, False]], [[0, 1, False]]]
+    })
+
+@pytest.fixture
+def mock_gwas_df():
+    return pd.DataFrame({
+        "DISEASE/TRAIT": ["Trait1", "Trait2"],
+        "PRS": [1.5, 2.0],
+        "mean_prs": [1.0, 1.8],
+        "z_score": [2.5, 1.5],
+        "Risk_Category": ["High Risk", "Normal Risk"]
+    })
+
+# Test dla serialize_report_inputs
+def test_serialize_report_inputs(mock_clinvar_df, mock_gwas_df):
+    payload = serialize_report_inputs(mock_clinvar_df, mock_gwas_df, "Summary")
+    assert payload["summary_text"] == "Summary"
+    assert pd.DataFrame(**payload["clinvar"]).equals(mock_clinvar_df)
+    assert pd.DataFrame(**payload["prs"]).equals(mock_gwas_df)
+
+# Test dla render_report (w bieżącym procesie)
+def test_render_report(tmp_path, mock_clinvar_df, mock_gwas_df):
+    output_file = tmp_path / "reports" / "report.pdf"
+    payload = serialize_report_inputs(mock_clinvar_df, mock_gwas_df, "Summary")
+
+    assert render_report(payload, str(output_file)) == str(output_file)
+    assert output_file.stat().st_size > 0
+
+# Test dla ReportRenderService (pula procesów i backpressure)
+def test_render_service(tmp_path, mock_clinvar_df, mock_gwas_df):
+    payload = serialize_report_inputs(mock_clinvar_df, mock_gwas_df, "Summary")
+
+    with ReportRenderService(workers=1, max_pending=1) as service:
+        first = service.submit(payload, str(tmp_path / "first.pdf"))
+        with pytest.raises(RenderQueueFull):
+            service.submit(payload, str(tmp_path / "second.pdf"), timeout=0)
+        first.result(timeout=60)
+
+        second = service.submit(payload, str(tmp_path / "second.pdf"), timeout=60)
+        second.result(timeout=60)
+
+    assert (tmp_path / "first.pdf").stat().st_size > 0
+    assert (tmp_path / "second.pdf").stat().st_size > 0
@@ -0,0 +1,74 @@
+import json
+import pytest
+import pandas as pd
+from app.services.streaming import (
+    project_columns,
+    filter_clinvar_results,
+    filter_prs_results,
+    paginate,
+    iter_ndjson_batches,
+    iter_arrow_batches
+)
+
+@pytest.fixture
+def mock_matched_variants():
+    return pd.DataFrame({
+        "CHROM": ["1", "1", "2"],
+        "POS": [12345, 54321, 11111],
+        "REF": ["A", "T", "G"],
+        "ALT": ["G", "C", "A"],
+        "CLNSIG": ["Pathogenic", "Benign", "Pathogenic"],
+        "GENOTYPES": [[[0, 1, False]], [[1, 1, True]], [[0, 1, False]]]
+    })
+
+# Test dla project_columns
+def test_project_columns(mock_matched_variants):
+    projected = project_columns(mock_matched_variants, ["POS", "CHROM"])
+    assert projected.columns.tolist() == ["POS", "CHROM"]
+    assert project_columns(mock_matched_variants, None) is mock_matched_variants
+
+    with pytest.raises(ValueError):
+        project_columns(mock_matched_variants, ["UNKNOWN"])
+
+# Test dla filtrów po stronie serwera
+def test_filters(mock_matched_variants):
+    filtered = filter_clinvar_results(mock_matched_variants, ["Pathogenic"])
+    assert filtered["POS"].tolist() == [12345, 11111]
+
+    prs_scores = pd.DataFrame({
+        "DISEASE/TRAIT": ["Trait1", "Trait2"],
+        "Risk_Category": ["High Risk", "Normal Risk"]
+    })
+    assert filter_prs_results(prs_scores, ["High Risk"])["DISEASE/TRAIT"].tolist() == ["Trait1"]
+
+# Test dla paginate
+def test_paginate(mock_matched_variants):
+    assert paginate(mock_matched_variants, 1, 1)["POS"].tolist() == [54321]
+    assert len(paginate(mock_matched_variants, 1, None)) == 2
+
+# Test dla iter_ndjson_batches
+def test_iter_ndjson_batches(mock_matched_variants):
+    batches = list(iter_ndjson_batches(mock_matched_variants, batch_size=2))
+    assert len(batches) == 2
+
+    records = [json.loads(line) for line in b"".join(batches).decode("utf-8").splitlines()]
+    assert len(records) == 3
+    assert records[0]["GENOTYPES"] == [[0, 1, False]]
+
+# Test dla iter_arrow_batches
+def test_iter_arrow_batches(mock_matched_variants):
+    pa = pytest.importorskip("pyarrow")
+
+    stream = b"".join(iter_arrow_batches(mock_matched_variants, batch_size=2))
+    table = pa.ipc.open_stream(stream).read_all()
+    assert table.num_rows == 3
+    assert table.column("GENOTYPES").to_pylist()[1] == [[1, 1, 1]]
+
+# Test dla iter_arrow_batches - pusty wynik daje strumień z samym schematem
+def test_iter_arrow_batches_empty(mock_matched_variants):
+    pa = pytest.importorskip("pyarrow")
+
+    stream = b"".join(iter_arrow_batches(mock_matched_variants.iloc[0:0][["CHROM", "POS"]]))
+    table = pa.ipc.open_stream(stream).read_all()
+    assert table.num_rows == 0
+    assert table.column_names == ["CHROM", "POS"]
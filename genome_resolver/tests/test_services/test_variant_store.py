@@ -0,0 +1,145 @@
+import pytest
+import pandas as pd
+from app.services.variant_store import (
+    VariantStore,
+    diff_clinvar,
+    diff_gwas_traits,
+    reanalyse_patients
+)
+from app.services.data_processing import merge_gwas_variants
+from app.services.reference_blocks import ReferenceBlockIndex
+
+# Mock danych ClinVar i GWAS
+@pytest.fixture
+def mock_clinvar_df():
+    return pd.DataFrame({
+        "CHROM": ["1", "1"],
+        "POS": [12345, 54321],
+        "REF": ["A", "T"],
+        "ALT": ["G", "C"],
+        "CLNSIG": ["Pathogenic", "Uncertain_significance"],
+        "GENEINFO": ["GENE1", "GENE2"],
+        "DISEASE": ["Disease1", "Disease2"]
+    })
+
+@pytest.fixture
+def mock_gwas_df():
+    return pd.DataFrame({
+        "CHR_ID": ["1", "2"],
+        "CHR_POS": [11111, 99999],
+        "SNP_ID_CURRENT": ["1", "2"],
+        "DISEASE/TRAIT": ["Trait1", "Trait2"],
+        "P-VALUE": [1e-9, 1e-9],
+        "OR or BETA": [1.5, 2.0],
+        "MAPPED_GENE": ["Gene1", "Gene2"]
+    })
+
+def make_patient(pos, ref, alt):
+    return pd.DataFrame({
+        "CHROM": ["1"],
+        "POS": [pos],
+        "REF": [ref],
+        "ALT": [alt],
+        "QUAL": [60.0],
+        "GENOTYPES": [[[0, 1, False]]]
+    })
+
+# Test dla zapisu i odczytu wariantów pacjenta
+def test_store_roundtrip(tmp_path):
+    store = VariantStore(str(tmp_path))
+    patient_df = make_patient(12345, "A", "G")
+    store.save_patient("P001", patient_df)
+
+    loaded = store.load_patient("P001")
+    assert store.patient_ids() == ["P001"]
+    assert loaded["GENOTYPES"].tolist() == [[[0, 1, False]]]
+    assert loaded["POS"].tolist() == [12345]
+
+# Test dla diff_clinvar
+def test_diff_clinvar(mock_clinvar_df):
+    new_clinvar = mock_clinvar_df.copy()
+    new_clinvar.loc[1, "CLNSIG"] = "Likely_pathogenic"
+    new_clinvar = pd.concat([new_clinvar, pd.DataFrame({
+        "CHROM": ["2"], "POS": [1], "REF": ["C"], "ALT": ["T"],
+        "CLNSIG": ["Benign"], "GENEINFO": ["GENE3"], "DISEASE": ["Disease3"]
+    })], ignore_index=True)
+
+    changed = diff_clinvar(mock_clinvar_df, new_clinvar)
+    assert sorted(changed["POS"].tolist()) == [1, 54321]
+
+# Test dla diff_gwas_traits
+def test_diff_gwas_traits(mock_gwas_df):
+    assert diff_gwas_traits(mock_gwas_df, mock_gwas_df.iloc[::-1]) == set()
+
+    new_gwas = mock_gwas_df.copy()
+    new_gwas.loc[1, "OR or BETA"] = 3.0
+    assert diff_gwas_traits(mock_gwas_df, new_gwas) == {"Trait2"}
+
+# Test dla reanalyse_patients - tylko pacjenci ze zmienionym raportem są oznaczani
+def test_reanalyse_patients(tmp_path, mock_clinvar_df, mock_gwas_df):
+    store = VariantStore(str(tmp_path))
+    prs_scores = pd.DataFrame({
+        "DISEASE/TRAIT": ["Trait1"],
+        "PRS": [1.5],
+        "mean_prs": [1.5],
+        "z_score": [0.0],
+        "Risk_Category": ["Normal Risk"]
+    })
+    for patient_id, (pos, ref, alt) in {"P001": (12345, "A", "G"), "P002": (54321, "T", "C")}.items():
+        patient_df = make_patient(pos, ref, alt)
+        matches = patient_df.merge(mock_clinvar_df, on=["CHROM", "POS", "REF", "ALT"])
+        store.save_patient(patient_id, patient_df)
+        store.save_results(patient_id, matches, prs_scores)
+
+    # Nowe wydanie ClinVar zmienia tylko wariant pacjenta P002
+    new_clinvar = mock_clinvar_df.copy()
+    new_clinvar.loc[1, "CLNSIG"] = "Pathogenic"
+
+    changed = reanalyse_patients(store, mock_clinvar_df, new_clinvar, mock_gwas_df, mock_gwas_df)
+    assert changed == {"P002": {"clinvar_changed": True, "prs_changed": False}}
+    clinvar_matches, _ = store.load_results("P002")
+    assert clinvar_matches["CLNSIG"].tolist() == ["Pathogenic"]
+
+    # Zmiana wagi dla Trait1 zmienia mean_prs, a więc raporty obu pacjentów
+    new_gwas = mock_gwas_df.copy()
+    new_gwas.loc[0, "OR or BETA"] = 0.5
+    changed = reanalyse_patients(store, new_clinvar, new_clinvar, mock_gwas_df, new_gwas)
+    assert changed == {
+        "P001": {"clinvar_changed": False, "prs_changed": True},
+        "P002": {"clinvar_changed": False, "prs_changed": True}
+    }
+    _, prs = store.load_results("P001")
+    assert prs["Risk_Category"].tolist() == ["High Risk"]
+
+# Test dla reanalyse_patients z blokami gVCF - zmiana wagi w pozycji bez wywołania nie zmienia raportu
+def test_reanalyse_patients_with_reference_blocks(mocker, tmp_path, mock_clinvar_df):
+    mocker.patch("app.services.data_processing.load_ld_blocks", return_value=pd.DataFrame({
+        "chromosome": ["1"],
+        "start": pd.array([1], dtype="Int64"),
+        "end": pd.array([100000], dtype="Int64")
+    }))
+    gwas_df = pd.DataFrame({
+        "CHR_ID": ["1", "1", "1"],
+        "CHR_POS": [12345, 20000, 90000],
+        "SNP_ID_CURRENT": ["1", "2", "3"],
+        "DISEASE/TRAIT": ["Trait1", "Trait1", "Trait1"],
+        "P-VALUE": [1e-9, 1e-9, 1e-9],
+        "OR or BETA": [1.5, 0.5, 0.7],
+        "MAPPED_GENE": ["Gene1", "Gene2", "Gene3"]
+    })
+    store = VariantStore(str(tmp_path))
+    patient_df = make_patient(12345, "A", "G")
+    # Pozycja 20000 to pewny hom-ref, 90000 nie ma wywołania
+    reference_blocks = ReferenceBlockIndex.from_records(["1"], [15000], [25000], [40])
+    prs_scores = merge_gwas_variants(patient_df.copy(), gwas_df, output_dir=None, reference_blocks=reference_blocks)
+    store.save_patient("P001", patient_df, reference_blocks)
+    store.save_results("P001", patient_df.iloc[0:0], prs_scores)
+    assert len(store.load_reference_blocks("P001")) == 1
+
+    new_gwas = gwas_df.copy()
+    new_gwas.loc[2, "OR or BETA"] = 1.2
+    changed = reanalyse_patients(store, mock_clinvar_df, mock_clinvar_df, gwas_df, new_gwas)
+    assert changed == {}
+    _, stored_prs = store.load_results("P001")
+    assert stored_prs["mean_prs"].tolist() == [2.0]
+    assert stored_prs["MISSING_SITES"].tolist() == [1]